@@ -0,0 +1,80 @@
+"""Encode time and bytes on the wire for /list-books.
+
+Seeds a catalog with project.seed, then times the JSON encoding of a
+/list-books page with the stdlib encoder against project.encoding, and
+requests the page with each Accept-Encoding to report the response time
+and the bytes sent:
+
+    python benchmarks/bench_compression.py --books 20000 --limit 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench_compression.db")}'
+os.environ.setdefault('LOG_FILE', os.path.join(workdir, 'app.log'))
+os.environ.setdefault('LOG_STDERR', '0')
+
+from sqlalchemy import select  # noqa: E402
+from project import app, db, encoding, seed  # noqa: E402
+from project.models import User  # noqa: E402
+from project.serializers import book_select, book_to_dict  # noqa: E402
+from tests.test_controllers import auth_headers  # noqa: E402
+
+
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=1000, help='Books per /list-books page.')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app.config['SECRET_KEY'] = 'bench-secret'
+    with app.app_context():
+        db.create_all()
+        seed.seed(users=10, genres=16, books=args.books, copies=args.books, reservations=0,
+                  reviews=0, bookmarks=0, transactions=0)
+        email = db.session.execute(select(User.email)).scalars().first()
+        rows = db.session.execute(book_select().limit(args.limit)).all()
+        payload = {'books': [book_to_dict(row) for row in rows], 'next_cursor': None}
+
+        print(f'{args.limit} books per page, {args.repeat} runs, min / median')
+        stdlib = best_ms(lambda: json.dumps(payload, default=encoding.json_default,
+                                            separators=(',', ':')).encode('utf-8'), args.repeat)
+        fast = best_ms(lambda: encoding.dumps(payload), args.repeat)
+        print(f'{"encode stdlib json":<24} {stdlib[0]:>8.2f} {stdlib[1]:>8.2f} ms')
+        print(f'{"encode project.encoding":<24} {fast[0]:>8.2f} {fast[1]:>8.2f} ms'
+              f'  ({"orjson" if encoding.orjson else "stdlib fallback"})')
+
+    client = app.test_client()
+    headers = auth_headers(email)
+    url = f'/list-books?limit={args.limit}'
+    print(f'{"Accept-Encoding":<24} {"min":>8} {"median":>8}    {"bytes":>10}')
+    for accept in ('identity', 'gzip', 'br'):
+        sizes = []
+
+        def fetch():
+            response = client.get(url, headers={**headers, 'Accept-Encoding': accept})
+            sizes.append(len(response.get_data()))
+
+        timing = best_ms(fetch, args.repeat)
+        print(f'{accept:<24} {timing[0]:>8.2f} {timing[1]:>8.2f} ms {sizes[-1]:>10,}')
+
+
+if __name__ == '__main__':
+    main()
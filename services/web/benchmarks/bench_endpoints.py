@@ -0,0 +1,424 @@
+"""Throughput and latency of every endpoint in project/controllers.py.
+
+Seeds a catalog of the given size with project.seed, then drives each endpoint through the
+Flask test client and reports requests/second and p50/p95/p99 latency.
+Results are written as JSON so two commits can be compared:
+
+    python benchmarks/bench_endpoints.py --output before.json
+    python benchmarks/bench_endpoints.py --output after.json --compare before.json
+    python benchmarks/bench_endpoints.py --books 2000 --copies 6000 --reservations 20000 --requests 50
+
+A --database-url that already holds a seeded catalog can be reused with
+--skip-seed; the write endpoints add rows to it.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--database-url', help='Defaults to a throwaway SQLite file.')
+parser.add_argument('--skip-seed', action='store_true', help='Use the data already in --database-url.')
+parser.add_argument('--users', type=int, default=1000)
+parser.add_argument('--genres', type=int, default=16)
+parser.add_argument('--books', type=int, default=100000)
+parser.add_argument('--copies', type=int, default=300000)
+parser.add_argument('--reservations', type=int, default=1000000)
+parser.add_argument('--reviews', type=int, default=200000)
+parser.add_argument('--bookmarks', type=int, default=200000)
+parser.add_argument('--transactions', type=int, default=50000)
+parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint.')
+parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint.')
+parser.add_argument('--only', help='Run the endpoints whose name contains this text.')
+parser.add_argument('--seed', type=int, default=1)
+parser.add_argument('--output', help='Write the results to this JSON file.')
+parser.add_argument('--compare', help='Earlier results file to print the change against.')
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp()
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+else:
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench_endpoints.db")}'
+os.environ.setdefault('LOG_FILE', os.path.join(workdir, 'app.log'))
+os.environ.setdefault('LOG_STDERR', '0')
+# X-DB-Queries on every response, for the queries column
+os.environ.setdefault('QUERY_STATS_HEADERS', '1')
+
+from sqlalchemy import func, select  # noqa: E402
+from project import app, db, reservations, seed  # noqa: E402
+from project.models import Book, BookCopy, Genre, Reservation, User  # noqa: E402
+from tests.test_controllers import auth_headers  # noqa: E402
+
+ADMIN = 'bench-admin@example.com'
+PASSWORD = seed.SEED_PASSWORD
+WORDS = seed.WORDS
+
+
+def seed_catalog():
+    db.create_all()
+    report = seed.seed(users=args.users, genres=args.genres, books=args.books, copies=args.copies,
+                       reservations=args.reservations, reviews=args.reviews, bookmarks=args.bookmarks,
+                       transactions=args.transactions, random_seed=args.seed)
+    db.session.add(User(email=ADMIN, first_name='Bench', last_name='Admin', password=PASSWORD, is_admin=True))
+    db.session.commit()
+    return report['seconds']
+
+
+# name -> (function, expected statuses, request limit, untimed preparation)
+SCENARIOS = {}
+
+
+def scenario(name, expect=(200,), max_requests=None, prepare=None):
+    def register(fn):
+        SCENARIOS[name] = (fn, expect, max_requests, prepare)
+        return fn
+    return register
+
+
+@scenario('POST /register', expect=(201,), max_requests=50)
+def register(client, ctx, i):
+    return client.post('/register', data={
+        'email': f'new{ctx["run"]}-{i}@example.com', 'first_name': 'New', 'last_name': 'User', 'password': PASSWORD
+    })
+
+
+@scenario('POST /login', expect=(201,), max_requests=50)
+def login(client, ctx, i):
+    return client.post('/login', data={'email': ctx['reader_email'], 'password': PASSWORD})
+
+
+@scenario('GET /profile/<user_id>')
+def get_profile(client, ctx, i):
+    return client.get(f'/profile/{ctx["rng"].choice(ctx["user_ids"])}')
+
+
+@scenario('PUT /profile/update/<user_id>')
+def update_profile(client, ctx, i):
+    return client.put(f'/profile/update/{ctx["user_ids"][i % len(ctx["user_ids"])]}',
+                      data={'address': f'{i} Updated Street'}, headers=ctx['reader'])
+
+
+@scenario('POST /add-book', expect=(201,))
+def add_book(client, ctx, i):
+    return client.post('/add-book', headers=ctx['reader'], data={
+        'isbn': f'new-{ctx["run"]}-{i}', 'title': 'Freshly Added Book', 'authors': 'New Author',
+        'language': 'English', 'num_pages': '250', 'genre_id': str(ctx['genre_ids'][0])
+    })
+
+
+@scenario('POST /import-books (100 rows)', max_requests=50)
+def import_books(client, ctx, i):
+    feed = 'isbn,title,authors,publisher,language,num_pages\n' + ''.join(
+        f'imp-{ctx["run"]}-{i}-{row},Imported Book {row},Import Author,Feed Press,English,300\n' for row in range(100)
+    )
+    return client.post('/import-books?format=csv', data=feed.encode(), headers=ctx['admin'],
+                       content_type='text/csv')
+
+
+@scenario('GET /list-books')
+def list_books(client, ctx, i):
+    return client.get('/list-books', headers=ctx['reader'])
+
+
+@scenario('GET /list-books?fields (3 fields)')
+def list_books_sparse(client, ctx, i):
+    return client.get('/list-books?fields=id,title,cover_image', headers=ctx['reader'])
+
+
+@scenario('GET /list-books?cursor')
+def list_books_page(client, ctx, i):
+    return client.get(f'/list-books?after_id={ctx["rng"].choice(ctx["book_ids"])}', headers=ctx['reader'])
+
+
+@scenario('GET /list-books (304)', expect=(304,))
+def list_books_not_modified(client, ctx, i):
+    if 'list_etag' not in ctx:
+        ctx['list_etag'] = client.get('/list-books', headers=ctx['reader']).headers['ETag']
+    return client.get('/list-books', headers={**ctx['reader'], 'If-None-Match': ctx['list_etag']})
+
+
+@scenario('GET /list-books?stream=1', max_requests=5)
+def list_books_stream(client, ctx, i):
+    return client.get('/list-books?stream=1', headers=ctx['reader'])
+
+
+@scenario('GET /get-book/<book_id>')
+def get_book(client, ctx, i):
+    return client.get(f'/get-book/{ctx["rng"].choice(ctx["book_ids"])}', headers=ctx['reader'])
+
+
+@scenario('GET /get-books?ids (50 ids)')
+def get_books(client, ctx, i):
+    ids = ','.join(str(book_id) for book_id in ctx['rng'].sample(ctx['book_ids'], 50))
+    return client.get(f'/get-books?ids={ids}', headers=ctx['reader'])
+
+
+@scenario('PUT /update-book/<book_id>')
+def update_book(client, ctx, i):
+    book_id = ctx['rng'].choice(ctx['book_ids'])
+    return client.put(f'/update-book/{book_id}', headers=ctx['reader'], data={
+        'isbn': f'upd-{book_id}', 'title': 'Updated Title', 'authors': 'Updated Author',
+        'language': 'English', 'num_pages': '123', 'genre_id': str(ctx['genre_ids'][0])
+    })
+
+
+def deletable_books(ctx, count):
+    # Books made for this run, by /add-book or here when it did not run
+    now = datetime.now()
+    db.session.execute(Book.__table__.insert(), [
+        {'isbn': f'del-{ctx["run"]}-{i}', 'title': 'To Be Deleted', 'authors': 'Nobody',
+         'created_at': now, 'updated_at': now}
+        for i in range(count)
+    ])
+    db.session.commit()
+    ctx['deletable_books'] = db.session.execute(
+        select(Book.id).where(Book.isbn.like(f'del-{ctx["run"]}-%'))
+    ).scalars().all()
+    db.session.remove()
+
+
+@scenario('DELETE /delete-book/<book_id>', prepare=deletable_books)
+def delete_book(client, ctx, i):
+    return client.delete(f'/delete-book/{ctx["deletable_books"].pop()}', headers=ctx['reader'])
+
+
+@scenario('POST /add-genre', expect=(201,))
+def add_genre(client, ctx, i):
+    return client.post('/add-genre', json={'name': f'Added genre {ctx["run"]} {i}'}, headers=ctx['reader'])
+
+
+@scenario('GET /list-genres')
+def list_genres(client, ctx, i):
+    return client.get('/list-genres', headers=ctx['reader'])
+
+
+@scenario('GET /get-genre/<genre_id>')
+def get_genre(client, ctx, i):
+    return client.get(f'/get-genre/{ctx["rng"].choice(ctx["genre_ids"])}', headers=ctx['reader'])
+
+
+def bench_genres(ctx, count):
+    # Genres nothing points at, so deleting them is the common case
+    now = datetime.now()
+    db.session.execute(Genre.__table__.insert(), [
+        {'name': f'Bench genre {ctx["run"]} {i}', 'created_at': now, 'updated_at': now} for i in range(count)
+    ])
+    db.session.commit()
+    ctx['bench_genres'] = db.session.execute(
+        select(Genre.id).where(Genre.name.like(f'Bench genre {ctx["run"]} %'))
+    ).scalars().all()
+    db.session.remove()
+
+
+@scenario('PUT /update-genre/<genre_id>', prepare=bench_genres)
+def update_genre(client, ctx, i):
+    genre_ids = ctx['bench_genres']
+    return client.put(f'/update-genre/{genre_ids[i % len(genre_ids)]}',
+                      json={'name': f'Bench genre {ctx["run"]} {i}'}, headers=ctx['reader'])
+
+
+@scenario('DELETE /delete-genre/<genre_id>', prepare=bench_genres)
+def delete_genre(client, ctx, i):
+    return client.delete(f'/delete-genre/{ctx["bench_genres"].pop()}', headers=ctx['reader'])
+
+
+@scenario('GET /search-books (one word)')
+def search_one_word(client, ctx, i):
+    return client.get(f'/search-books?keyword={ctx["rng"].choice(WORDS)}', headers=ctx['reader'])
+
+
+@scenario('GET /search-books (two words)')
+def search_two_words(client, ctx, i):
+    rng = ctx['rng']
+    return client.get(f'/search-books?keyword={rng.choice(WORDS)}+{rng.choice(WORDS)[:3]}', headers=ctx['reader'])
+
+
+@scenario('POST /reserve-book/<book_id>', expect=(201, 409))
+def reserve_book(client, ctx, i):
+    response = client.post(f'/reserve-book/{ctx["rng"].choice(ctx["book_ids"])}', headers=ctx['reader'])
+    if response.status_code == 201:
+        ctx['reserved'].append(response.get_json()['id'])
+    return response
+
+
+def enough_reservations(ctx, count):
+    # Some reserve requests find no free copy; top up outside the timing
+    rng = ctx['rng']
+    while len(ctx['reserved']) < count:
+        reservation = reservations.reserve(ctx['reader_id'], rng.choice(ctx['book_ids']))
+        if reservation:
+            ctx['reserved'].append(reservation.id)
+    db.session.remove()
+
+
+@scenario('POST /borrow-book/<reservation_id>', prepare=enough_reservations)
+def borrow_book(client, ctx, i):
+    reservation_id = ctx['reserved'].pop()
+    ctx['borrowed'].append(reservation_id)
+    return client.post(f'/borrow-book/{reservation_id}', headers=ctx['reader'])
+
+
+@scenario('POST /return-book/<reservation_id>')
+def return_book(client, ctx, i):
+    return client.post(f'/return-book/{ctx["borrowed"].pop()}', headers=ctx['reader'])
+
+
+@scenario('GET /cache-stats')
+def cache_stats(client, ctx, i):
+    return client.get('/cache-stats', headers=ctx['admin'])
+
+
+@scenario('GET /pool-stats')
+def pool_stats(client, ctx, i):
+    return client.get('/pool-stats', headers=ctx['admin'])
+
+
+@scenario('GET /error_route', expect=(500,), max_requests=20)
+def error_route(client, ctx, i):
+    return client.get('/error_route')
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_scenario(client, ctx, fn, expect, count, warmup):
+    for i in range(warmup):
+        fn(client, ctx, -1 - i)
+    timings = []
+    statuses = {}
+    queries = 0
+    started = time.perf_counter()
+    for i in range(count):
+        request_started = time.perf_counter()
+        response = fn(client, ctx, i)
+        # Reading the body is part of the request, streamed ones included
+        response.get_data()
+        timings.append((time.perf_counter() - request_started) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        queries = max(queries, int(response.headers.get('X-DB-Queries', 0)))
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'requests': count,
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'unexpected_status': sum(n for status, n in statuses.items() if status not in expect),
+        'throughput_rps': round(count / elapsed, 1),
+        'mean_ms': round(sum(timings) / count, 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_queries': queries,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline):
+    previous = baseline['endpoints'] if baseline else {}
+    header = f'{"endpoint":<38}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"bad":>5}{"qry":>5}'
+    print(header + ('   p50 vs base' if baseline else ''))
+    for name, result in results['endpoints'].items():
+        line = (f'{name:<38}{result["throughput_rps"]:>9.1f}{result["p50_ms"]:>9.2f}'
+                f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}{result["unexpected_status"]:>5}{result.get("max_queries", 0):>5}')
+        if name in previous and previous[name]['p50_ms']:
+            change = (result['p50_ms'] - previous[name]['p50_ms']) / previous[name]['p50_ms'] * 100
+            line += f'{change:>+13.1f}%'
+        print(line)
+
+
+def main():
+    rng = random.Random(args.seed)
+    with app.app_context():
+        if args.skip_seed:
+            print('using existing data')
+        else:
+            print(f'seeding {args.users} users, {args.books} books, {args.copies} copies, '
+                  f'{args.reservations} reservations...')
+            print(f'seeded in {seed_catalog():.1f}s')
+
+        reader_id, reader_email = db.session.execute(
+            select(User.id, User.email)
+            .where(User.email.like('%@seed.example.com'), User.active.is_(True))
+            .order_by(User.id).limit(1)
+        ).one()
+        ctx = {
+            'rng': rng,
+            # Keeps the rows written by this run apart from earlier ones
+            'run': int(time.time()),
+            'user_ids': db.session.execute(
+                select(User.id).where(User.email.like('%@seed.example.com'))
+            ).scalars().all(),
+            'genre_ids': db.session.execute(select(Genre.id)).scalars().all(),
+            'book_ids': db.session.execute(select(Book.id)).scalars().all(),
+            'reader_id': reader_id,
+            'reader_email': reader_email,
+            'reader': None,
+            'admin': None,
+            'reserved': [],
+            'borrowed': [],
+        }
+        counts = {
+            'users': db.session.execute(select(func.count()).select_from(User)).scalar(),
+            'books': len(ctx['book_ids']),
+            'copies': db.session.execute(select(func.count()).select_from(BookCopy)).scalar(),
+            'reservations': db.session.execute(select(func.count()).select_from(Reservation)).scalar(),
+        }
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    app.config['SECRET_KEY'] = app.config['SECRET_KEY'] or 'bench-secret'
+    ctx['reader'] = auth_headers(ctx['reader_email'])
+    ctx['admin'] = auth_headers(ADMIN)
+    client = app.test_client()
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': dialect,
+            'rows': counts,
+            'requests': args.requests,
+            'seed': args.seed,
+        },
+        'endpoints': {},
+    }
+    for name, (fn, expect, max_requests, prepare) in SCENARIOS.items():
+        if args.only and args.only not in name:
+            continue
+        count = min(args.requests, max_requests) if max_requests else args.requests
+        warmup = min(args.warmup, count)
+        with app.app_context():
+            if prepare:
+                prepare(ctx, count + warmup)
+            results['endpoints'][name] = run_scenario(client, ctx, fn, expect, count, warmup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Login storm: login throughput and tail latency of other endpoints.
+
+Starts the app on a local threaded server, keeps --storm clients logging
+in for --duration seconds and meanwhile times a steady stream of
+authenticated /list-genres requests. Run it with different caps to see
+the effect of the bounded password verifier:
+
+    python benchmarks/bench_login.py --login-concurrency 2
+    python benchmarks/bench_login.py --login-concurrency 64
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--storm', type=int, default=16, help='Concurrent login clients.')
+parser.add_argument('--duration', type=float, default=10)
+parser.add_argument('--login-concurrency', type=int, default=2)
+parser.add_argument('--login-queue', type=int, default=16)
+args = parser.parse_args()
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_login.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['LOGIN_MAX_CONCURRENCY'] = str(args.login_concurrency)
+os.environ['LOGIN_MAX_QUEUED'] = str(args.login_queue)
+os.environ.setdefault('SECRET_KEY', 'bench-secret')
+
+from werkzeug.serving import make_server  # noqa: E402
+from project import app, db  # noqa: E402
+from project.models import Genre, User  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float('nan')
+
+
+def request(url, data=None, headers=None):
+    body = urllib.parse.urlencode(data).encode() if data else None
+    req = urllib.request.Request(url, data=body, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email='storm@example.com', first_name='Storm', last_name='User', password='password'))
+        db.session.add(Genre(name='Fiction'))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    credentials = {'email': 'storm@example.com', 'password': 'password'}
+    token = json.loads(request(f'{base}/login', credentials)[1])['token']
+
+    stop = threading.Event()
+    logins = {'ok': 0, 'busy': 0, 'other': 0}
+    lock = threading.Lock()
+
+    def storm():
+        while not stop.is_set():
+            status, _ = request(f'{base}/login', credentials)
+            key = 'ok' if status == 201 else 'busy' if status == 503 else 'other'
+            with lock:
+                logins[key] += 1
+
+    probe_ms = []
+
+    def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            request(f'{base}/list-genres', headers={'x-access-token': token})
+            probe_ms.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=storm) for _ in range(args.storm)] + [threading.Thread(target=probe)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    print(f'{args.storm} login clients, login concurrency {args.login_concurrency}, {args.duration:.0f}s')
+    print(f'logins ok:        {logins["ok"]} ({logins["ok"] / args.duration:.1f}/s)')
+    print(f'logins shed 503:  {logins["busy"]}')
+    print(f'logins failed:    {logins["other"]}')
+    print(f'/list-genres during storm: {len(probe_ms)} requests, '
+          f'p50 {statistics.median(probe_ms):.1f}ms, '
+          f'p95 {percentile(probe_ms, 95):.1f}ms, p99 {percentile(probe_ms, 99):.1f}ms')
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Concurrent reservation stress test.
+
+Many workers reserve copies of a handful of popular books at once; the run
+fails if any copy ends up with more than one reservation, and reports how
+many reservations per second went through:
+
+    python benchmarks/bench_reservations.py --workers 32 --books 5 --copies 200
+    python benchmarks/bench_reservations.py --database-url mysql+pymysql://...
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--database-url', help='Defaults to a throwaway SQLite file.')
+parser.add_argument('--workers', type=int, default=16)
+parser.add_argument('--books', type=int, default=5)
+parser.add_argument('--copies', type=int, default=100, help='Copies per book.')
+parser.add_argument('--attempts', type=int, default=None, help='Reservation attempts per worker.')
+args = parser.parse_args()
+
+db_path = None
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+else:
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_reservations.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from sqlalchemy import func, select  # noqa: E402
+from project import app, availability, db, reservations  # noqa: E402
+from project.models import Book, BookCopy, Reservation, User  # noqa: E402
+
+
+def seed():
+    user = User(email='bench@example.com', first_name='Bench', last_name='User', password='password')
+    db.session.add(user)
+    book_ids = []
+    for i in range(args.books):
+        book = Book(isbn=f'bench-{i}', title=f'Popular Book {i}', authors='Author')
+        db.session.add(book)
+        db.session.flush()
+        book_ids.append(book.id)
+        db.session.execute(BookCopy.__table__.insert(), [
+            {'book_id': book.id, 'book_type': 'Paperback', 'availability': True} for _ in range(args.copies)
+        ])
+    db.session.commit()
+    availability.reconcile()
+    return user.id, book_ids
+
+
+def main():
+    # Twice as many attempts as copies, so every copy is fought over
+    attempts = args.attempts or max(1, 2 * args.books * args.copies // args.workers)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user_id, book_ids = seed()
+
+    reserved = []
+    errors = []
+    barrier = threading.Barrier(args.workers)
+
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            for _ in range(attempts):
+                try:
+                    if reservations.reserve(user_id, random.choice(book_ids)):
+                        reserved.append(1)
+                except Exception as e:
+                    errors.append(str(e))
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        double_booked = db.session.execute(
+            select(Reservation.bookcopy_id)
+            .group_by(Reservation.bookcopy_id)
+            .having(func.count() > 1)
+        ).all()
+        free = db.session.execute(
+            select(func.count()).select_from(BookCopy).where(BookCopy.availability.is_(True))
+        ).scalar()
+        db.drop_all()
+
+    total_copies = args.books * args.copies
+    print(f'{args.workers} workers, {args.workers * attempts} attempts on {total_copies} copies')
+    print(f'reservations:   {len(reserved)} in {elapsed:.2f}s ({len(reserved) / elapsed:,.0f}/s)')
+    print(f'copies left:    {free}')
+    print(f'errors:         {len(errors)}')
+    print(f'double booked:  {len(double_booked)}')
+    if db_path:
+        os.remove(db_path)
+    if double_booked:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
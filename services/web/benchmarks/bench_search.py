@@ -0,0 +1,70 @@
+"""Compare the full-text search path with the old ilike scan.
+
+Seeds a throwaway SQLite catalog and times both lookups for a few keywords:
+
+    python benchmarks/bench_search.py --books 200000 --repeat 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from project import app, db, search  # noqa: E402
+from project.models import Book  # noqa: E402
+
+WORDS = ['river', 'shadow', 'garden', 'empire', 'winter', 'silent', 'glass', 'harbor',
+         'machine', 'letters', 'orchard', 'north', 'fire', 'memory', 'island', 'voyage']
+KEYWORDS = ['shadow', 'winter garden', 'mach', 'Author 4217']
+
+
+def seed(count):
+    rows = []
+    for i in range(count):
+        rows.append({
+            'isbn': f'978{i:010d}',
+            'title': ' '.join(WORDS[(i * k) % len(WORDS)] for k in (1, 3, 7)).title(),
+            'authors': f'Author {i % 5000}',
+        })
+        if len(rows) == 10000:
+            db.session.execute(Book.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Book.__table__.insert(), rows)
+    db.session.commit()
+    search.rebuild_index()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.books)
+        print(f'{args.books} books, limit {args.limit}, mean of {args.repeat} runs')
+        print(f'{"keyword":<16}{"ilike ms":>12}{"fts ms":>12}')
+        for keyword in KEYWORDS:
+            like_ms = timed(lambda: search.like_book_ids(keyword, args.limit), args.repeat)
+            fts_ms = timed(lambda: search.ranked_book_ids(keyword, args.limit), args.repeat)
+            print(f'{keyword:<16}{like_ms:>12.2f}{fts_ms:>12.2f}')
+        db.drop_all()
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Per-request cost of Sentry tracing and profiling at different sample rates.
+
+Each setting runs in its own process, because the SDK and the profiler are
+process-wide. Envelopes go to a transport that drops them, so only the
+in-process overhead is measured:
+
+    python benchmarks/bench_sentry.py --requests 3000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# name -> (dsn set, traces sample rate, profiles sample rate)
+SETTINGS = {
+    'no-dsn': (False, 0.0, 0.0),
+    'traces-0': (True, 0.0, 0.0),
+    'traces-0.05': (True, 0.05, 0.0),
+    'traces-1': (True, 1.0, 0.0),
+    'traces-1-profiles-1': (True, 1.0, 1.0),
+}
+
+
+def child(setting, requests):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_sentry.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['SENTRY_DSN'] = ''
+    os.environ['LOG_STDERR'] = '0'
+
+    from sentry_sdk.transport import Transport
+    from project import app, db, tracing
+    from project.models import Genre, User
+    from tests.test_controllers import auth_headers
+
+    class NullTransport(Transport):
+        sent = 0
+
+        def capture_envelope(self, envelope):
+            NullTransport.sent += 1
+
+        def capture_event(self, event):
+            NullTransport.sent += 1
+
+    dsn_set, traces_rate, profiles_rate = SETTINGS[setting]
+    if dsn_set:
+        app.config.update(
+            SENTRY_DSN='https://public@sentry.invalid/1',
+            SENTRY_TRACES_SAMPLE_RATE=traces_rate,
+            SENTRY_TRACES_ROUTE_RATES='',
+            SENTRY_PROFILES_SAMPLE_RATE=profiles_rate,
+            SENTRY_SLOW_REQUEST_MS=float('inf'),
+        )
+        tracing.init_sentry(app, transport=NullTransport)
+
+    app.config['SECRET_KEY'] = 'bench-secret'
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email='bench@example.com', first_name='Bench', last_name='User', password='password'))
+        db.session.add_all([Genre(name=f'Genre {i}') for i in range(50)])
+        db.session.commit()
+
+    client = app.test_client()
+    headers = auth_headers('bench@example.com')
+    for _ in range(200):
+        client.get('/list-genres', headers=headers)
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get('/list-genres', headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(json.dumps({
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p99_ms': timings[int(len(timings) * 0.99)],
+        'envelopes': NullTransport.sent,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--child', choices=SETTINGS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.requests)
+        return
+
+    print(f'{args.requests} GET /list-genres per setting')
+    print(f'{"setting":<22}{"mean ms":>9}{"p50 ms":>9}{"p99 ms":>9}{"overhead":>10}{"envelopes":>11}')
+    baseline = None
+    for setting in SETTINGS:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', setting, '--requests', str(args.requests)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        baseline = baseline if baseline is not None else result['mean_ms']
+        print(f'{setting:<22}{result["mean_ms"]:>9.3f}{result["p50_ms"]:>9.3f}{result["p99_ms"]:>9.3f}'
+              f'{result["mean_ms"] - baseline:>+10.3f}{result["envelopes"]:>11}')
+
+
+if __name__ == '__main__':
+    main()
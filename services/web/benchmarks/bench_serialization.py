@@ -0,0 +1,111 @@
+"""Rows/second for the book listing serialization paths.
+
+Compares hydrating Book ORM instances, building dicts by hand and encoding
+with the stdlib encoder against selecting the book columns as plain rows
+and encoding them with project.serializers.dumps, in full and narrowed to
+a grid view's ?fields=id,title,cover_image:
+
+    python benchmarks/bench_serialization.py --books 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from project import app, db  # noqa: E402
+from project.models import Book  # noqa: E402
+from project.serializers import book_fields, book_select, book_to_dict, dumps  # noqa: E402
+
+GRID_FIELDS = book_fields('id,title,cover_image')
+
+
+def seed(count):
+    rows = []
+    for i in range(count):
+        rows.append({
+            'isbn': f'978{i:010d}',
+            'title': f'Book {i}',
+            'authors': f'Author {i % 5000}',
+            'publisher': 'Publisher',
+            'publication_date': date(1950 + i % 70, 1 + i % 12, 1 + i % 28),
+            'description': 'A fairly ordinary description of the book. ' * 4,
+            'language': 'English',
+            'num_pages': 100 + i % 900,
+        })
+        if len(rows) == 10000:
+            db.session.execute(Book.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Book.__table__.insert(), rows)
+    db.session.commit()
+
+
+def orm_path():
+    books = []
+    for book in Book.query.all():
+        books.append({
+            'id': book.id,
+            'isbn': book.isbn,
+            'title': book.title,
+            'authors': book.authors,
+            'publisher': book.publisher,
+            'publication_date': book.publication_date,
+            'description': book.description,
+            'language': book.language,
+            'num_pages': book.num_pages,
+            'cover_image': book.cover_image,
+            'genre_id': book.genre_id
+        })
+    body = json.dumps(books, default=str).encode('utf-8')
+    db.session.expunge_all()
+    return body
+
+
+def column_path():
+    rows = db.session.execute(book_select()).all()
+    return dumps([book_to_dict(row) for row in rows])
+
+
+def sparse_path():
+    rows = db.session.execute(book_select(GRID_FIELDS)).all()
+    return dumps([book_to_dict(row, GRID_FIELDS) for row in rows])
+
+
+def measure(fn, count, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.books)
+        before = measure(orm_path, args.books, args.repeat)
+        after = measure(column_path, args.books, args.repeat)
+        sparse = measure(sparse_path, args.books, args.repeat)
+        print(f'{args.books} books, best of {args.repeat} runs')
+        print(f'ORM + dict + json:   {before:>12,.0f} rows/s  {len(orm_path()):>12,} bytes')
+        print(f'columns + dumps:     {after:>12,.0f} rows/s  {len(column_path()):>12,} bytes  ({after / before:.1f}x)')
+        print(f'?fields= grid view:  {sparse:>12,.0f} rows/s  {len(sparse_path()):>12,} bytes  ({sparse / before:.1f}x)')
+        db.drop_all()
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
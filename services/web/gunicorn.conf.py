@@ -0,0 +1,17 @@
+# Loaded by gunicorn from the working directory
+import os
+import shutil
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to the new workers' ones
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
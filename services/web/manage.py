@@ -1,11 +1,97 @@
 # This is for CLI tools configurations 
+import json
+import time
+import urllib.request
+import click
+import jwt
 from flask.cli import FlaskGroup
 # from project import app, db
 
 from project import app
+from project import availability, importer, search, seed as seeding
+from project.utils import import_format
 
 cli = FlaskGroup(app)
 
+
+@cli.command("reindex_search")
+def reindex_search():
+    """Rebuild the book full-text search index from the book table."""
+    search.rebuild_index()
+
+
+@cli.command("import-books")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(list(importer.READERS)), help="Defaults to the file extension.")
+@click.option("--batch-size", type=int, help="Rows per executemany batch.")
+@click.option("--commit-every", type=int, help="Rows between commits.")
+def import_books(path, fmt, batch_size, commit_every):
+    """Upsert books on isbn from a CSV or NDJSON file."""
+    fmt = fmt or import_format(path)
+    if fmt is None:
+        raise click.UsageError("Cannot tell the format from the file name, pass --format.")
+    try:
+        with open(path, encoding="utf-8", newline="") as lines:
+            report = importer.import_books(lines, fmt, batch_size=batch_size, commit_every=commit_every)
+    except importer.UnsupportedDialect as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(report, indent=2))
+
+
+@cli.command("reconcile-copies")
+def reconcile_copies():
+    """Recompute Book.total_copies/available_copies from bookcopy rows."""
+    drifted = availability.reconcile()
+    click.echo(f"{drifted} book(s) had drifted counters and were fixed.")
+
+@cli.command("seed")
+@click.option("--users", type=int, default=1000, show_default=True)
+@click.option("--genres", type=int, default=16, show_default=True)
+@click.option("--books", type=int, default=100000, show_default=True)
+@click.option("--copies", type=int, default=300000, show_default=True)
+@click.option("--reservations", type=int, default=1000000, show_default=True)
+@click.option("--reviews", type=int, default=200000, show_default=True)
+@click.option("--bookmarks", type=int, default=200000, show_default=True)
+@click.option("--transactions", type=int, default=50000, show_default=True)
+@click.option("--book-zipf", type=float, default=1.1, show_default=True, help="Zipf exponent of book popularity.")
+@click.option("--user-zipf", type=float, default=0.8, show_default=True, help="Zipf exponent of reader activity.")
+@click.option("--years", type=int, default=3, show_default=True, help="How far back reservations go.")
+@click.option("--open-fraction", type=float, default=0.05, show_default=True,
+              help="Share of reservations still open.")
+@click.option("--seed", "random_seed", type=int, default=1, show_default=True)
+@click.option("--today", type=click.DateTime(formats=["%Y-%m-%d"]), help="Anchor for all dates, defaults to today.")
+@click.option("--batch-size", type=int, help="Rows per executemany batch.")
+def seed(today, **options):
+    """Fill the database with synthetic users, books and their history.
+
+    Every seeded user's password is "password".
+    """
+    report = seeding.seed(today=today.date() if today else None, **options)
+    click.echo(json.dumps(report, indent=2))
+
+
+@cli.command("slow-queries")
+@click.option("--url", default="http://localhost:5000", show_default=True, help="A running instance of the app.")
+@click.option("--admin", "email", required=True, help="Email of an admin user to sign the request as.")
+@click.option("--limit", type=int, default=20, show_default=True)
+def slow_queries(url, email, limit):
+    """Print the slow queries a running instance recorded, newest first.
+
+    The instance needs SLOW_QUERY_LOG=1. Each worker process keeps its own
+    log, so with several workers this shows the one that answered.
+    """
+    token = jwt.encode({"public_id": email, "exp": int(time.time()) + 60}, app.config["SECRET_KEY"])
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/slow-queries?limit={limit}",
+        headers={"x-access-token": token.decode("utf-8") if isinstance(token, bytes) else token}
+    )
+    with urllib.request.urlopen(request) as response:
+        report = json.load(response)
+    if not report["enabled"]:
+        raise click.ClickException("The slow query log is off, start the app with SLOW_QUERY_LOG=1.")
+    click.echo(json.dumps(report, indent=2))
+
+
 # @cli.command("create_db")
 # def create_db():
 #     db.drop_all()
@@ -0,0 +1,33 @@
+"""book full text search
+
+Revision ID: 0a7c514f6f04
+Revises: 99b0473366b8
+Create Date: 2026-10-18 10:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7c514f6f04'
+down_revision = '99b0473366b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.execute('CREATE FULLTEXT INDEX ix_book_fulltext ON book (title, isbn, authors)')
+    elif dialect == 'sqlite':
+        op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(title, isbn, authors)')
+        op.execute('INSERT INTO book_fts (rowid, title, isbn, authors) SELECT id, title, isbn, authors FROM book')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.drop_index('ix_book_fulltext', table_name='book')
+    elif dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS book_fts')
@@ -0,0 +1,35 @@
+"""catalog version
+
+Revision ID: 58485d251436
+Revises: 0a7c514f6f04
+Create Date: 2026-10-18 11:03:27.640195
+
+"""
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '58485d251436'
+down_revision = '0a7c514f6f04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_version = op.create_table('catalog_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    op.bulk_insert(catalog_version, [
+        {'name': 'book', 'version': 0, 'updated_at': now},
+        {'name': 'genre', 'version': 0, 'updated_at': now},
+    ])
+
+
+def downgrade():
+    op.drop_table('catalog_version')
@@ -0,0 +1,34 @@
+"""book copy counters
+
+Revision ID: 92987b1b8385
+Revises: 58485d251436
+Create Date: 2026-10-18 12:20:05.913377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '92987b1b8385'
+down_revision = '58485d251436'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.add_column(sa.Column('total_copies', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('available_copies', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        'UPDATE book SET '
+        'total_copies = (SELECT count(*) FROM bookcopy WHERE bookcopy.book_id = book.id), '
+        'available_copies = (SELECT count(*) FROM bookcopy WHERE bookcopy.book_id = book.id AND bookcopy.availability)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.drop_column('available_copies')
+        batch_op.drop_column('total_copies')
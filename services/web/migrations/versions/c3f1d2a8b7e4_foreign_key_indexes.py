@@ -0,0 +1,53 @@
+"""foreign key indexes
+
+Revision ID: c3f1d2a8b7e4
+Revises: 92987b1b8385
+Create Date: 2026-10-18 14:02:41.218904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1d2a8b7e4'
+down_revision = '92987b1b8385'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, unique); every foreign key column leads one of them
+INDEXES = [
+    ('ix_profile_user_id', 'profile', ['user_id'], False),
+    ('ix_book_genre_id', 'book', ['genre_id'], False),
+    ('ix_bookcopy_book_id_availability', 'bookcopy', ['book_id', 'availability'], False),
+    ('ix_bookrequest_user_id', 'bookrequest', ['user_id'], False),
+    ('ix_review_user_id', 'review', ['user_id'], False),
+    ('ix_review_book_id', 'review', ['book_id'], False),
+    ('ix_bookmark_user_id_book_id', 'bookmark', ['user_id', 'book_id'], True),
+    ('ix_bookmark_book_id', 'bookmark', ['book_id'], False),
+    ('ix_reservation_user_id_status', 'reservation', ['user_id', 'status'], False),
+    ('ix_reservation_bookcopy_id', 'reservation', ['bookcopy_id'], False),
+    ('ix_transaction_user_id', 'transaction', ['user_id'], False),
+    ('ix_transaction_reservation_id', 'transaction', ['reservation_id'], False),
+]
+
+
+def upgrade():
+    # The unique bookmark index needs duplicates gone; the oldest one stays.
+    # The derived table lets MySQL read the table it deletes from.
+    op.execute(
+        'DELETE FROM bookmark WHERE id NOT IN '
+        '(SELECT id FROM (SELECT min(id) AS id FROM bookmark GROUP BY user_id, book_id) AS keep)'
+    )
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    # InnoDB needs an index on every foreign key and has dropped the ones it
+    # made itself in favour of these, so on MySQL they have to stay
+    if op.get_bind().dialect.name == 'mysql':
+        return
+    for name, table, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
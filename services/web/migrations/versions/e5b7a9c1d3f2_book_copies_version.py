@@ -0,0 +1,28 @@
+"""book copies version
+
+Revision ID: e5b7a9c1d3f2
+Revises: c3f1d2a8b7e4
+Create Date: 2026-10-18 16:40:12.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7a9c1d3f2'
+down_revision = 'c3f1d2a8b7e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.add_column(sa.Column('copies_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('copies_changed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.drop_column('copies_changed_at')
+        batch_op.drop_column('copies_version')
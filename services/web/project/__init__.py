@@ -1,64 +1,104 @@
-import logging
-import os
-import sentry_sdk
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, Response, jsonify, request
+from werkzeug.security import safe_join
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.utils import secure_filename
-from sqlalchemy import text
 from flask_migrate import Migrate
 import jwt
 
-
-sentry_sdk.init(
-    dsn=os.getenv("SENTRY_DSN"),
-    # Set traces_sample_rate to 1.0 to capture 100%
-    # of transactions for performance monitoring.
-    traces_sample_rate=1.0,
-    # Set profiles_sample_rate to 1.0 to profile 100%
-    # of sampled transactions.
-    # We recommend adjusting this value in production.
-    profiles_sample_rate=1.0,
-)
+from . import compression, encoding, logs, metrics, pool, querystats, slowlog, tracing
+from .storage import CONTENT_ADDRESSED, UploadRequest, send_stored_file
 
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 # Enable CORS
 CORS(app)
 
-# Logging
-app.logger.setLevel(logging.INFO)
-handler = logging.FileHandler("app.log")
-formatter = logging.Formatter('%(asctime)s - %(message)s')  # Include the date in the log messages
-handler.setFormatter(formatter)  # Set the formatter for the handler
-app.logger.addHandler(handler)
-
 # Load configuration
 app.config.from_object("project.config.Config")
+
+# jsonify() and request.get_json() through orjson, see encoding.py
+app.json = encoding.JSONProvider(app)
+
+# Logging: JSON lines written by a background thread, see logs.py;
+# records dropped on a full queue are counted in /metrics
+log_handler = logs.configure(app, on_drop=metrics.count_log_drop)
+
+# Sentry tracing, sampled per route, see tracing.py
+sentry_sampler = tracing.init_sentry(app)
+
+# Pool settings from the DB_POOL_* variables, see pool.py
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    **pool.engine_options(app.config),
+    **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+}
 db = SQLAlchemy(app)
+metrics.init_app(app)
+querystats.init_app(app)
+# Registered last so its hook runs first and the others see the compressed response
+compression.init_app(app)
+# Off unless SLOW_QUERY_LOG is set, see slowlog.py
+slow_query_log = slowlog.init_app(app, db)
+database_ready = pool.ReadinessCheck(lambda: db.engine, app.config["READINESS_CACHE_TTL"])
 
 migrate = Migrate(app, db)
 
-from . import controllers
+from . import controllers, thumbnails
+from .utils import handle_file_upload
 
 
 @app.route("/")
 def home():
-    try:
-        db.session.execute(text('SELECT 1'))
+    ready, error = database_ready()
+    if ready:
         return 'Database is connected!'
-    except Exception as e:
-        app.logger.error(f'Database connection error: {str(e)}')
-        return f'Database connection error: {str(e)}'
+    app.logger.error(f'Database connection error: {error}')
+    return f'Database connection error: {error}'
+
+@app.route("/healthz")
+def healthz():
+    # Liveness only: the process answers, the database is not touched
+    return jsonify({'status': 'ok'})
+
+@app.route("/readyz")
+def readyz():
+    ready, error = database_ready()
+    if not ready:
+        app.logger.error(f'readyz view: {error}')
+        return jsonify({'status': 'unavailable', 'message': 'Database is unreachable!'}), 503
+    return jsonify({'status': 'ready'})
+
+@app.route("/metrics")
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
 @app.route("/static/<path:filename>")
 def staticfiles(filename):
-    return send_from_directory(app.config["STATIC_FOLDER"], filename)
+    return send_stored_file(
+        app.config["STATIC_FOLDER"], filename,
+        accel_prefix=app.config["STATIC_ACCEL_PREFIX"],
+        max_age=app.config["STATIC_CACHE_MAX_AGE"]
+    )
 
 @app.route("/media/<path:filename>")
 def mediafiles(filename):
-    return send_from_directory(app.config["MEDIA_FOLDER"], filename)
+    # A content-addressed name never changes meaning, nor do its thumbnails
+    immutable = bool(CONTENT_ADDRESSED.match(filename))
+    size = request.args.get("size")
+    if size:
+        if size not in thumbnails.SIZES:
+            return jsonify({'message': f'Size must be one of {", ".join(thumbnails.SIZES)}!'}), 400
+        # Rendered on first request if the upload-time job has not run yet
+        if thumbnails.available() and safe_join(app.config["MEDIA_FOLDER"], filename):
+            filename = thumbnails.generate(filename, size) or filename
+    return send_stored_file(
+        app.config["MEDIA_FOLDER"], filename,
+        accel_prefix=app.config["MEDIA_ACCEL_PREFIX"],
+        max_age=31536000 if immutable else app.config["MEDIA_CACHE_MAX_AGE"],
+        immutable=immutable
+    )
 
 @app.route("/upload", methods=["GET", "POST"])
 def upload_file():
@@ -67,10 +107,8 @@ def upload_file():
         if file.filename == '':
             return "No selected file"
         if file:
-            filename = secure_filename(file.filename)
-            print(".... ", os.path.join(app.config["MEDIA_FOLDER"], filename))
-            file.save(os.path.join(app.config["MEDIA_FOLDER"], filename))
-            return 'File uploaded successfully'
+            url = handle_file_upload(file)
+            return f'File uploaded successfully: {url}'
     return """
     <!doctype html>
     <title>upload new File</title>
@@ -78,4 +116,3 @@ def upload_file():
       <p><input type=file name=file><input type=submit value=Upload>
     </form>
     """
-
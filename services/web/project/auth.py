@@ -0,0 +1,54 @@
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import app
+from .cache import TTLCache
+from .models import User
+
+
+# public_id -> UserSnapshot for tokens that have already been verified
+token_cache = TTLCache(
+    maxsize=app.config['TOKEN_CACHE_SIZE'],
+    ttl=app.config['TOKEN_CACHE_TTL']
+)
+
+
+def user_for_token(data):
+    """Return the snapshot of the user a decoded token belongs to.
+
+    Snapshots are cached per worker and never outlive the token's `exp`,
+    so repeat requests with a live token need no auth query.
+    """
+    public_id = data['public_id']
+    snapshot = token_cache.get(public_id)
+    if snapshot is not None:
+        return snapshot
+
+    user = User.query.filter_by(email=public_id).first()
+    if user is None:
+        return None
+
+    snapshot = user.snapshot()
+    ttl = data['exp'] - time.time() if 'exp' in data else None
+    token_cache.set(public_id, snapshot, ttl=ttl)
+    return snapshot
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def queue_token_invalidation(mapper, connection, user):
+    # Old and new emails both lose their snapshot once the change commits
+    emails = {user.email, *inspect(user).attrs.email.history.deleted}
+    inspect(user).session.info.setdefault('stale_tokens', set()).update(emails)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_tokens(session):
+    for email in session.info.pop('stale_tokens', ()):
+        token_cache.delete(email)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_token_invalidation(session):
+    session.info.pop('stale_tokens', None)
@@ -0,0 +1,97 @@
+from sqlalchemy import event, func, inspect, or_, select
+
+from . import db
+from .conditional import utcnow
+from .models import Book, BookCopy
+
+
+book_table = Book.__table__
+bookcopy_table = BookCopy.__table__
+
+
+def adjust_counters(connection, book_id, total=0, available=0):
+    """Shift a book's copy counters inside the caller's transaction.
+
+    Book payloads carry the counters, but only the book's own copies_version
+    moves, not the book catalog version: every reservation would otherwise
+    queue on the one catalog_version row and reset every book ETag.
+    """
+    if book_id is None or (total == 0 and available == 0):
+        return
+    connection.execute(
+        book_table.update()
+        .where(book_table.c.id == book_id)
+        .values(
+            total_copies=book_table.c.total_copies + total,
+            available_copies=book_table.c.available_copies + available,
+            copies_version=book_table.c.copies_version + 1,
+            copies_changed_at=utcnow()
+        )
+    )
+
+
+@event.listens_for(BookCopy, 'after_insert')
+def count_new_copy(mapper, connection, copy):
+    adjust_counters(connection, copy.book_id, total=1, available=1 if copy.availability else 0)
+
+
+@event.listens_for(BookCopy, 'after_delete')
+def count_deleted_copy(mapper, connection, copy):
+    adjust_counters(connection, copy.book_id, total=-1, available=-1 if copy.availability else 0)
+
+
+@event.listens_for(BookCopy, 'after_update')
+def count_updated_copy(mapper, connection, copy):
+    state = inspect(copy)
+    book_history = state.attrs.book_id.history
+    availability_history = state.attrs.availability.history
+    if not book_history.has_changes() and not availability_history.has_changes():
+        return
+
+    old_book_id = book_history.deleted[0] if book_history.deleted else copy.book_id
+    old_available = bool(availability_history.deleted[0] if availability_history.deleted else copy.availability)
+    if old_book_id == copy.book_id:
+        adjust_counters(connection, copy.book_id, available=int(bool(copy.availability)) - int(old_available))
+    else:
+        adjust_counters(connection, old_book_id, total=-1, available=-int(old_available))
+        adjust_counters(connection, copy.book_id, total=1, available=int(bool(copy.availability)))
+
+
+def counter_validators(*criteria, limit=None):
+    """Return (token, last change) for the counters of the books matching `criteria`.
+
+    The books are taken in id order up to `limit`, like a listing page. The
+    token is the sum of their copies_version, which grows on every change.
+    """
+    books = select(book_table.c.copies_version, book_table.c.copies_changed_at)\
+        .where(*criteria).order_by(book_table.c.id).limit(limit).subquery()
+    token, changed_at = db.session.execute(
+        select(func.coalesce(func.sum(books.c.copies_version), 0), func.max(books.c.copies_changed_at))
+    ).one()
+    return token, changed_at
+
+
+def copy_counts():
+    total = select(func.count()).where(bookcopy_table.c.book_id == book_table.c.id).scalar_subquery()
+    available = select(func.count())\
+        .where(bookcopy_table.c.book_id == book_table.c.id, bookcopy_table.c.availability.is_(True))\
+        .scalar_subquery()
+    return total, available
+
+
+def reconcile():
+    """Recompute the counters of books that drifted from bookcopy; return how many."""
+    total, available = copy_counts()
+    # The fixed rows get a new copies_version so their ETags stop matching
+    drifted = db.session.execute(
+        book_table.update()
+        .where(or_(book_table.c.total_copies != total, book_table.c.available_copies != available))
+        .values(
+            total_copies=total,
+            available_copies=available,
+            copies_version=book_table.c.copies_version + 1,
+            copies_changed_at=utcnow()
+        )
+    ).rowcount
+    db.session.commit()
+    return drifted
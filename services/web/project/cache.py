@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after a time-to-live.
+
+    The cache lives in the worker process, so each gunicorn worker keeps its
+    own copy; the TTL bounds how stale an entry can get in the other workers.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class VersionedCache:
+    """Read-through cache of a whole collection, checked against a version.
+
+    `load` returns the collection and `version` a token that changes on
+    every write (such as a catalog_version row, which every worker shares).
+    Within `ttl` seconds the cached value is served without touching the
+    database; after that the version is re-read and the value reloaded only
+    if it changed, so writes show up in every worker within `ttl` seconds.
+    """
+
+    def __init__(self, load, version, ttl=5):
+        self.load = load
+        self.version = version
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._value = None
+        self._version = None
+        self._checked_at = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._checked_at < self.ttl:
+                self.hits += 1
+                return self._value
+            generation = self._generation
+
+        # The lock is not held across queries, so a slow database only holds
+        # up the requests that have to wait for it. Read the version before
+        # the data so a concurrent write can only make the next check
+        # reload, never pin stale data
+        version = self.version()
+        with self._lock:
+            if self._value is not None and version == self._version:
+                self._checked_at = time.monotonic()
+                self.hits += 1
+                return self._value
+            self.misses += 1
+
+        value = self.load()
+        with self._lock:
+            # A value loaded across an invalidate() may predate that write
+            if generation == self._generation:
+                self._value = value
+                self._version = version
+                self._checked_at = time.monotonic()
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._version = None
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
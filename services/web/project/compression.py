@@ -0,0 +1,77 @@
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def supported_encodings():
+    # In order of preference when the client accepts both equally
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compressor(encoding, config):
+    """Return (compress, finish) callables for `encoding`."""
+    if encoding == 'br':
+        state = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        return state.process, state.finish
+    # wbits=31 writes the gzip header and trailer
+    state = zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+    return state.compress, state.flush
+
+
+def compress_stream(chunks, encoding, config):
+    compress, finish = compressor(encoding, config)
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def compress_response(response):
+    """Compress the body with the best encoding the client accepts.
+
+    Bodies under COMPRESS_MIN_SIZE go out as they are, since the headers and
+    CPU cost more than the bytes saved. Streamed bodies are compressed chunk
+    by chunk as they are produced.
+    """
+    config = current_app.config
+    if response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or request.method == 'HEAD' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    encoding = request.accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        body = response.response
+        response.response = compress_stream(response.iter_encoded(), encoding, config)
+        if hasattr(body, 'close'):
+            response.call_on_close(body.close)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        compress, finish = compressor(encoding, config)
+        response.set_data(compress(data) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity ones
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    if app.config['COMPRESS']:
+        app.after_request(compress_response)
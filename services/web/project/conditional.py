@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+from functools import wraps
+from flask import g, request, make_response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import Book, CatalogVersion, Genre
+
+
+# Collections whose list and detail endpoints answer conditional GETs,
+# keyed by the model whose writes bump their version
+VERSIONED_MODELS = {Book: 'book', Genre: 'genre'}
+
+catalog_version_table = CatalogVersion.__table__
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def seed_catalog_versions(target, connection, **kw):
+    connection.execute(
+        catalog_version_table.insert(),
+        [{'name': name, 'version': 0, 'updated_at': utcnow()} for name in VERSIONED_MODELS.values()]
+    )
+
+
+event.listen(catalog_version_table, 'after_create', seed_catalog_versions)
+
+
+def bump_catalog_version(connection, name):
+    result = connection.execute(
+        catalog_version_table.update()
+        .where(catalog_version_table.c.name == name)
+        .values(version=catalog_version_table.c.version + 1, updated_at=utcnow())
+    )
+    if result.rowcount == 0:
+        connection.execute(catalog_version_table.insert(), {'name': name, 'version': 1, 'updated_at': utcnow()})
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_written_collections(session, flush_context):
+    names = {
+        VERSIONED_MODELS[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in VERSIONED_MODELS
+    }
+    for name in sorted(names):
+        bump_catalog_version(session.connection(), name)
+
+
+def catalog_validators(name):
+    """Return the (etag, last_modified) pair for a versioned collection."""
+    row = db.session.execute(
+        select(CatalogVersion.version, CatalogVersion.updated_at).where(CatalogVersion.name == name)
+    ).first()
+    if row is None:
+        return None, None
+    last_modified = row.updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+    return f'{name}-{row.version}-{int(last_modified.timestamp())}', last_modified
+
+
+def request_catalog_etag(name):
+    """Return the etag of collection `name`, reusing the one @conditional
+    read for the current request if it did."""
+    etag = g.get('catalog_etags', {}).get(name)
+    return etag if etag is not None else catalog_validators(name)[0]
+
+
+def is_not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(name, fingerprint=None):
+    """Answer GETs with 304 Not Modified while collection `name` is unchanged.
+
+    The validators come from the collection's catalog_version row, so a
+    matching request is answered before the view serializes anything.
+    Payloads that also carry state the version does not cover pass
+    `fingerprint`, called with the view's URL arguments. It returns a
+    (token, changed_at) pair for that state, or None to skip the check.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            etag, last_modified = catalog_validators(name)
+            if etag is None:
+                return f(*args, **kwargs)
+            g.setdefault('catalog_etags', {})[name] = etag
+            if fingerprint is not None:
+                validators = fingerprint(**kwargs)
+                if validators is None:
+                    return f(*args, **kwargs)
+                token, changed_at = validators
+                etag = f'{etag}-{token}'
+                if changed_at is not None:
+                    last_modified = max(last_modified, changed_at.replace(tzinfo=timezone.utc, microsecond=0))
+
+            if is_not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            return response
+
+        return decorated
+
+    return decorator
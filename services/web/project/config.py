@@ -7,9 +7,82 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 class Config(object):
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///database.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool, ignored for in-memory SQLite
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    # Below MySQL's wait_timeout, so the server never closes a pooled connection first
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true")
+    READINESS_CACHE_TTL = float(os.getenv("READINESS_CACHE_TTL", 2))
     STATIC_FOLDER = f"{os.getenv('APP_FOLDER')}/project/static"
     MEDIA_FOLDER = f"{os.getenv('APP_FOLDER')}/project/media"
+    # Let nginx send /static and /media bytes through its internal locations
+    ACCEL_REDIRECT = os.getenv("ACCEL_REDIRECT", "0").lower() in ("1", "true")
+    STATIC_ACCEL_PREFIX = os.getenv("STATIC_ACCEL_PREFIX", "/protected-static/")
+    MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")
+    STATIC_CACHE_MAX_AGE = int(os.getenv("STATIC_CACHE_MAX_AGE", 3600))
+    MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", 3600))
     SECRET_KEY = os.getenv("SECRET_KEY")
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024 * 1024))  # 16MB
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FILE = os.getenv("LOG_FILE", "app.log")
+    # Records wait here for the writer thread; past this they are dropped
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))  # 10MB
+    LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 7))
+    LOG_STDERR = os.getenv("LOG_STDERR", "1").lower() in ("1", "true")
+    LOG_ACCESS = os.getenv("LOG_ACCESS", "1").lower() in ("1", "true")
+    # Response compression, gzip or brotli as the client accepts
+    COMPRESS = os.getenv("COMPRESS", "1").lower() in ("1", "true")
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_MIMETYPES = os.getenv("COMPRESS_MIMETYPES", "application/json,text/plain,text/csv,text/html").split(",")
+    # Dynamic responses are compressed per request, so cheap levels pay off best
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 1))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+    # Queries a request may run before it is logged; views declare their own
+    # with @query_budget. X-DB-* headers are sent in debug mode or with this set
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 20))
+    QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "0").lower() in ("1", "true")
+    # Opt-in: keep the last SLOW_QUERY_BUFFER statements slower than
+    # SLOW_QUERY_MS, with their EXPLAIN, for GET /slow-queries
+    SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "0").lower() in ("1", "true")
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+    SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", 200))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1").lower() in ("1", "true")
+    SENTRY_DSN = os.getenv("SENTRY_DSN")
+    SENTRY_TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", 0.05))
+    # Per URL rule overrides, e.g. "/login=0.2,/metrics=0"
+    SENTRY_TRACES_ROUTE_RATES = os.getenv("SENTRY_TRACES_ROUTE_RATES", "/metrics=0")
+    SENTRY_PROFILES_SAMPLE_RATE = float(os.getenv("SENTRY_PROFILES_SAMPLE_RATE", 0))
+    # A 5xx or a request this slow traces its route in full for SENTRY_BOOST_SECONDS
+    SENTRY_SLOW_REQUEST_MS = float(os.getenv("SENTRY_SLOW_REQUEST_MS", 1000))
+    SENTRY_BOOST_SECONDS = float(os.getenv("SENTRY_BOOST_SECONDS", 60))
+    THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+    THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+    # Werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000";
+    # hashes written with other parameters are upgraded on the next login
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    LOGIN_MAX_CONCURRENCY = int(os.getenv("LOGIN_MAX_CONCURRENCY", 2))
+    LOGIN_MAX_QUEUED = int(os.getenv("LOGIN_MAX_QUEUED", 16))
+    LOGIN_VERIFY_TIMEOUT = float(os.getenv("LOGIN_VERIFY_TIMEOUT", 10))
+    BOOK_PAGE_SIZE = int(os.getenv("BOOK_PAGE_SIZE", 100))
+    BOOK_PAGE_SIZE_MAX = int(os.getenv("BOOK_PAGE_SIZE_MAX", 1000))
+    BOOK_STREAM_CHUNK_SIZE = int(os.getenv("BOOK_STREAM_CHUNK_SIZE", 500))
+    BOOK_BATCH_MAX = int(os.getenv("BOOK_BATCH_MAX", 500))
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 4096))
+    TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", 60))
+    GENRE_CACHE_TTL = float(os.getenv("GENRE_CACHE_TTL", 5))
+    BOOK_IMPORT_BATCH_SIZE = int(os.getenv("BOOK_IMPORT_BATCH_SIZE", 1000))
+    BOOK_IMPORT_COMMIT_EVERY = int(os.getenv("BOOK_IMPORT_COMMIT_EVERY", 10000))
+    BOOK_IMPORT_MAX_ERRORS = int(os.getenv("BOOK_IMPORT_MAX_ERRORS", 1000))
+    # Feeds are streamed rather than buffered, so they may exceed MAX_CONTENT_LENGTH; 0 means no limit
+    BOOK_IMPORT_MAX_CONTENT_LENGTH = int(os.getenv("BOOK_IMPORT_MAX_CONTENT_LENGTH", 1024 * 1024 * 1024))  # 1GB
+    SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", 10000))
+    RESERVATION_LOAN_DAYS = int(os.getenv("RESERVATION_LOAN_DAYS", 14))
+    RESERVATION_CLAIM_CANDIDATES = int(os.getenv("RESERVATION_CLAIM_CANDIDATES", 8))
+    RESERVATION_CLAIM_ATTEMPTS = int(os.getenv("RESERVATION_CLAIM_ATTEMPTS", 3))
 
 
 class TestConfig(Config):
@@ -1,13 +1,19 @@
-from flask import Flask, request, jsonify, make_response
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, g, request, jsonify, make_response, Response, stream_with_context
 from datetime import datetime, timedelta
+import io
 import jwt
 from functools import wraps
+from sqlalchemy import select
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from . import app, db
-from .utils import handle_file_upload
-from .models import User, Book, Genre, Profile
-from .serializers import UserRegistrationSerializer
+from . import app, availability, db, importer, passwords, pool, reservations, search, slow_query_log, thumbnails
+from .auth import token_cache, user_for_token
+from .cache import VersionedCache
+from .conditional import conditional, request_catalog_etag
+from .querystats import query_budget
+from .utils import handle_file_upload, encode_cursor, decode_cursor, import_format
+from .models import User, Book, Genre, Profile, Reservation
+from .serializers import UserRegistrationSerializer, book_fields, book_select, book_to_dict, dumps, json_response
 
 
 def token_required(f):
@@ -26,14 +32,14 @@ def token_required(f):
         try:
             # decoding the payload to fetch the stored details
             data = jwt.decode(token, app.config['SECRET_KEY'])
-            current_user = User.query\
-                .filter_by(email = data['public_id'])\
-                .first()
+            current_user = user_for_token(data)
         except Exception as e:
             app.logger.error(f'token_required view: {str(e)}')
             return jsonify({
                 'message' : 'Token is invalid !!'
             }), 401
+        # picked up by the request log records
+        g.user_id = current_user.id if current_user else None
         # returns the current logged in users context to the routes
         return  f(current_user, *args, **kwargs)
   
@@ -99,7 +105,16 @@ def login():
                 {'WWW-Authenticate': 'Basic realm="User does not exist!"'}
             )
         
-        if check_password_hash(user.password_hash, auth.get('password')):
+        if passwords.verify_password(user.password_hash, auth.get('password')):
+            if passwords.needs_rehash(user.password_hash):
+                # Upgrading the hash is best effort; the password was right either way
+                try:
+                    user.password_hash = passwords.rehash_password(auth.get('password'))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.warning(f'login view: rehash failed: {str(e) or type(e).__name__}')
+
             token = jwt.encode({
                 'public_id': user.email,
                 'exp' : datetime.now() + timedelta(minutes = 1440)
@@ -112,30 +127,42 @@ def login():
             403,
             {'WWW-Authenticate' : 'Basic realm ="Wrong Password !!"'}
         )
+    except passwords.VerifierBusy:
+        return make_response(jsonify({'message': 'Too many logins, try again shortly!'}), 503, {'Retry-After': '1'})
     except Exception as e:
         app.logger.error(f'login view: {str(e)}')   
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
 
 
 @app.route('/profile/<int:user_id>', methods=['GET'])
+@query_budget(1)
 def get_profile(user_id):
     try:
-        user = User.query.get(user_id)
-        if not user:
+        # The user and their first profile in one query, rather than a
+        # lookup followed by a lazy load of user.profile
+        row = db.session.execute(
+            select(User.first_name, User.last_name, User.email,
+                   Profile.id.label('profile_id'), Profile.address, Profile.cover_image, Profile.mobile_number)
+            .outerjoin(Profile, Profile.user_id == User.id)
+            .where(User.id == user_id)
+            .order_by(Profile.id)
+            .limit(1)
+        ).first()
+        if not row:
             return make_response(jsonify({'message': 'User not found!'}), 404)
 
         # Check if the profile exists, assuming a one-to-one relationship managed correctly
-        if not user.profile:
+        if row.profile_id is None:
             return make_response(jsonify({'message': 'Profile not found for this user!'}), 404)
 
         # Extract profile data
         profile_data = {
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'email': user.email,
-            'address': user.profile[0].address,  # Ensure user.profile is not a list
-            'cover_image': user.profile[0].cover_image,
-            'mobile_number': user.profile[0].mobile_number
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'email': row.email,
+            'address': row.address,
+            'cover_image': row.cover_image,
+            'mobile_number': row.mobile_number
         }
 
         return make_response(jsonify(profile_data), 200)
@@ -161,7 +188,7 @@ def update_profile(current_user, user_id):
             profile = Profile(user_id=user.id)
             db.session.add(profile)
         else:
-            profile = user.profile
+            profile = user.profile[0]
 
         # Update the fields if provided in the request
         if 'first_name' in data:
@@ -170,16 +197,23 @@ def update_profile(current_user, user_id):
             user.last_name = data['last_name']  # Assuming user has last_name
         if 'address' in data:
             profile.address = data['address']
-        if 'cover_image' in data:
+        cover_image = request.files.get('cover_image')
+        if cover_image:
+            profile.cover_image = handle_file_upload(cover_image)
+        elif 'cover_image' in data:
             profile.cover_image = data['cover_image']
         if 'mobile_number' in data:
             profile.mobile_number = data['mobile_number']
 
         # Commit the changes to the database
         db.session.commit()
+        if cover_image:
+            thumbnails.schedule(profile.cover_image)
 
         return make_response(jsonify({'message': 'Profile updated successfully!'}), 200)
 
+    except RequestEntityTooLarge:
+        return make_response(jsonify({'message': 'File too large!'}), 413)
     except Exception as e:
         app.logger.error(f'update_profile view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
@@ -210,36 +244,121 @@ def create_book(current_user):
             genre_id=data.get('genre_id')
         )
         db.session.add(book)
+        db.session.flush()
+        search.index_book(book)
         db.session.commit()
+        thumbnails.schedule(file_location)
         return make_response(jsonify({'message': 'Book created successfully!'}), 201)
+    except RequestEntityTooLarge:
+        return make_response(jsonify({'message': 'File too large!'}), 413)
     except Exception as e:
         app.logger.error(f'create_book view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
 
 
+def stream_books(after_id, fields):
+    # Reads the catalog through a server-side cursor and writes the JSON
+    # array chunk by chunk, so memory stays flat whatever the catalog size
+    chunk_size = app.config['BOOK_STREAM_CHUNK_SIZE']
+    rows = db.session.execute(
+        book_select(fields)
+        .where(Book.id > after_id)
+        .order_by(Book.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    yield b'['
+    first = True
+    for partition in rows.partitions():
+        chunk = b','.join(dumps(book_to_dict(row, fields)) for row in partition)
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b']'
+
+
+# Bulk import books from a CSV or NDJSON feed
+@app.route('/import-books', methods=['POST'])
+@token_required
+def bulk_import_books(current_user):
+    try:
+        if not current_user or not current_user.is_admin:
+            return make_response(jsonify({'message': 'Admin access required!'}), 403)
+
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        fmt = request.args.get('format') or import_format(upload.filename if upload else request.mimetype)
+        if fmt not in importer.READERS:
+            return make_response(jsonify({'message': 'Format must be csv or ndjson!'}), 400)
+
+        lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        report = importer.import_books(lines, fmt)
+        return make_response(jsonify(report), 200)
+    except RequestEntityTooLarge:
+        return make_response(jsonify({'message': 'File too large!'}), 413)
+    except importer.UnsupportedDialect:
+        return make_response(jsonify({'message': 'Bulk import is not supported on this database!'}), 501)
+    except Exception as e:
+        app.logger.error(f'bulk_import_books view: {str(e)}')
+        return make_response(jsonify({'message': 'Something went wrong!'}), 500)
+
+
+def listing_after_id():
+    # Raises ValueError on a cursor that does not decode
+    cursor = request.args.get('cursor')
+    return decode_cursor(cursor) if cursor else request.args.get('after_id', 0, type=int)
+
+
+def listing_limit():
+    limit = request.args.get('limit', app.config['BOOK_PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['BOOK_PAGE_SIZE_MAX']))
+
+
+def listing_counters():
+    # The copy counters of the books on the requested page, or the whole stream
+    try:
+        after_id = listing_after_id()
+    except ValueError:
+        return None
+    if request.args.get('stream') in ('1', 'true'):
+        return availability.counter_validators(Book.id > after_id)
+    return availability.counter_validators(Book.id > after_id, limit=listing_limit())
+
+
 # Get all books
 @app.route('/list-books', methods=['GET'])
+@query_budget(4)
 @token_required
+@conditional('book', fingerprint=listing_counters)
 def get_all_books(current_user):
     try:
-        books = Book.query.all()
-        book_list = []
-        for book in books:
-            book_data = {
-                'id': book.id,
-                'isbn': book.isbn,
-                'title': book.title,
-                'authors': book.authors,
-                'publisher': book.publisher,
-                'publication_date': book.publication_date,
-                'description': book.description,
-                'language': book.language,
-                'num_pages': book.num_pages,
-                'cover_image': book.cover_image,
-                'genre_id': book.genre_id
-            }
-            book_list.append(book_data)
-        return jsonify(book_list)
+        try:
+            after_id = listing_after_id()
+        except ValueError:
+            return make_response(jsonify({'message': 'Invalid cursor!'}), 400)
+        try:
+            fields = book_fields(request.args.get('fields'))
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        if request.args.get('stream') in ('1', 'true'):
+            return Response(stream_with_context(stream_books(after_id, fields)), mimetype='application/json')
+
+        limit = listing_limit()
+
+        # Fetch one extra row to know whether another page exists
+        rows = db.session.execute(
+            book_select(fields, 'id')
+            .where(Book.id > after_id)
+            .order_by(Book.id)
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return json_response({
+            'books': [book_to_dict(row, fields) for row in rows],
+            'next_cursor': encode_cursor(rows[-1].id) if has_more else None
+        })
     except Exception as e:
         app.logger.error(f'get_all_books view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
@@ -247,31 +366,81 @@ def get_all_books(current_user):
 
 # Get a specific book
 @app.route('/get-book/<int:book_id>', methods=['GET'])
+@query_budget(4)
 @token_required
+@conditional('book', fingerprint=lambda book_id: availability.counter_validators(Book.id == book_id))
 def get_book(current_user, book_id):
     try:
-        book = Book.query.get(book_id)
-        if not book:
+        try:
+            fields = book_fields(request.args.get('fields'))
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        row = db.session.execute(book_select(fields).where(Book.id == book_id)).first()
+        if not row:
             return make_response(jsonify({'message': 'Book not found!'}), 404)
-        book_data = {
-            'id': book.id,
-            'isbn': book.isbn,
-            'title': book.title,
-            'authors': book.authors,
-            'publisher': book.publisher,
-            'publication_date': book.publication_date,
-            'description': book.description,
-            'language': book.language,
-            'num_pages': book.num_pages,
-            'cover_image': book.cover_image,
-            'genre_id': book.genre_id
-        }
-        return jsonify(book_data)
+        return json_response(book_to_dict(row, fields))
     except Exception as e:
         app.logger.error(f'get_book view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
 
 
+def batch_keys():
+    """Return (field, keys) from ?ids= or ?isbns=; raises ValueError with the message for a 400."""
+    if ('ids' in request.args) == ('isbns' in request.args):
+        raise ValueError('Either ids or isbns is required!')
+
+    field = 'id' if 'ids' in request.args else 'isbn'
+    keys = [key.strip() for key in request.args[field + 's'].split(',') if key.strip()]
+    if field == 'id':
+        try:
+            keys = [int(key) for key in keys]
+        except ValueError:
+            raise ValueError('Ids must be integers!')
+    # Repeated keys are answered once, at their first position
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        raise ValueError('Either ids or isbns is required!')
+    if len(keys) > app.config['BOOK_BATCH_MAX']:
+        raise ValueError(f'At most {app.config["BOOK_BATCH_MAX"]} books per request!')
+    return field, keys
+
+
+def batch_counters():
+    try:
+        field, keys = batch_keys()
+    except ValueError:
+        return None
+    return availability.counter_validators(getattr(Book, field).in_(keys))
+
+
+# Get many books at once, by ?ids=1,2,3 or ?isbns=...
+@app.route('/get-books', methods=['GET'])
+@query_budget(4)
+@token_required
+@conditional('book', fingerprint=batch_counters)
+def get_books(current_user):
+    try:
+        try:
+            field, keys = batch_keys()
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+        try:
+            fields = book_fields(request.args.get('fields'))
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        rows = db.session.execute(book_select(fields, field).where(getattr(Book, field).in_(keys))).all()
+        books = {getattr(row, field): book_to_dict(row, fields) for row in rows}
+        return json_response({
+            'books': [books[key] for key in keys if key in books],
+            'missing': [key for key in keys if key not in books]
+        })
+    except Exception as e:
+        app.logger.error(f'get_books view: {str(e)}')
+        return make_response(jsonify({'message': 'Something went wrong!'}), 500)
+
+
 # Update a book
 @app.route('/update-book/<int:book_id>', methods=['PUT'])
 @token_required
@@ -298,9 +467,13 @@ def update_book(current_user, book_id):
         book.num_pages = data.get('num_pages')
         book.cover_image = file_location if file_location else book.cover_image
         book.genre_id = data.get('genre_id')
+        search.index_book(book)
         db.session.commit()
+        thumbnails.schedule(file_location)
         return make_response(jsonify({'message': 'Book updated successfully!'}), 200)
     
+    except RequestEntityTooLarge:
+        return make_response(jsonify({'message': 'File too large!'}), 413)
     except Exception as e:
         app.logger.error(f'update_book view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
@@ -314,6 +487,7 @@ def delete_book(current_user, book_id):
         book = Book.query.get(book_id)
         if not book:
             return make_response(jsonify({'message': 'Book not found!'}), 404)
+        search.remove_book(book.id)
         db.session.delete(book)
         db.session.commit()
         return make_response(jsonify({'message': 'Book deleted successfully!'}), 200)
@@ -335,26 +509,34 @@ def create_genre(current_user):
         )
         db.session.add(genre)
         db.session.commit()
+        genre_cache.invalidate()
         return make_response(jsonify({'message': 'Genre created successfully!'}), 201)
     except Exception as e:
         app.logger.error(f'create_genre view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
 
 
+def load_genres():
+    rows = db.session.execute(select(Genre.id, Genre.name).order_by(Genre.id))
+    return {row.id: {'id': row.id, 'name': row.name} for row in rows}
+
+
+genre_cache = VersionedCache(
+    load=load_genres,
+    version=lambda: request_catalog_etag('genre'),
+    ttl=app.config['GENRE_CACHE_TTL']
+)
+
+
 # Get all genres
 @app.route('/list-genres', methods=['GET'])
+@query_budget(3)
 @token_required
+@conditional('genre')
 def get_all_genres(current_user):
     try:
-        genres = Genre.query.all()
-        genre_list = []
-        for genre in genres:
-            genre_data = {
-                'id': genre.id,
-                'name': genre.name
-            }
-            genre_list.append(genre_data)
-        return jsonify(genre_list)
+        genres = genre_cache.get()
+        return jsonify(list(genres.values()))
     except Exception as e:
         app.logger.error(f'get_all_genres view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
@@ -362,16 +544,13 @@ def get_all_genres(current_user):
 
 # Get a specific genre
 @app.route('/get-genre/<int:genre_id>', methods=['GET'])
+@query_budget(3)
 @token_required
 def get_genre(current_user, genre_id):
     try:
-        genre = Genre.query.get(genre_id)
-        if not genre:
+        genre_data = genre_cache.get().get(genre_id)
+        if not genre_data:
             return make_response(jsonify({'message': 'Genre not found!'}), 404)
-        genre_data = {
-            'id': genre.id,
-            'name': genre.name
-        }
         return jsonify(genre_data)
     except Exception as e:
         app.logger.error(f'get_genre view: {str(e)}')
@@ -389,6 +568,7 @@ def update_genre(current_user, genre_id):
         data = request.get_json()
         genre.name = data.get('name')
         db.session.commit()
+        genre_cache.invalidate()
         return make_response(jsonify({'message': 'Genre updated successfully!'}), 200)
     
     except Exception as e:
@@ -406,6 +586,7 @@ def delete_genre(current_user, genre_id):
             return make_response(jsonify({'message': 'Genre not found!'}), 404)
         db.session.delete(genre)
         db.session.commit()
+        genre_cache.invalidate()
         return make_response(jsonify({'message': 'Genre deleted successfully!'}), 200)
     
     except Exception as e:
@@ -414,37 +595,142 @@ def delete_genre(current_user, genre_id):
 
 
 @app.route('/search-books', methods=['GET'])
+@query_budget(3)
 @token_required
 def search_books(current_user):
     try:
         search_keyword = request.args.get('keyword')
-        books = Book.query.filter(
-            (Book.title.ilike(f'%{search_keyword}%')) |
-            (Book.isbn.ilike(f'%{search_keyword}%')) |
-            (Book.authors.ilike(f'%{search_keyword}%'))
-        ).all()
-        book_list = []
-        for book in books:
-            book_data = {
-                'id': book.id,
-                'isbn': book.isbn,
-                'title': book.title,
-                'authors': book.authors,
-                'publisher': book.publisher,
-                'publication_date': book.publication_date,
-                'description': book.description,
-                'language': book.language,
-                'num_pages': book.num_pages,
-                'cover_image': book.cover_image,
-                'genre_id': book.genre_id
-            }
-            book_list.append(book_data)
-        return jsonify(book_list)
+        if not search.search_terms(search_keyword):
+            return make_response(jsonify({'message': 'Keyword is required!'}), 400)
+        try:
+            fields = book_fields(request.args.get('fields'))
+        except ValueError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        limit = request.args.get('limit', app.config['BOOK_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, app.config['BOOK_PAGE_SIZE_MAX']))
+        offset = max(0, request.args.get('offset', 0, type=int))
+
+        # Fetch one extra id to know whether another page exists
+        book_ids = search.ranked_book_ids(search_keyword, limit + 1, offset)
+        has_more = len(book_ids) > limit
+        book_ids = book_ids[:limit]
+
+        rows = db.session.execute(book_select(fields, 'id').where(Book.id.in_(book_ids))).all() if book_ids else []
+        books = {row.id: book_to_dict(row, fields) for row in rows}
+        return json_response({
+            'books': [books[book_id] for book_id in book_ids if book_id in books],
+            'next_offset': offset + limit if has_more else None
+        })
     except Exception as e:
         app.logger.error(f'search_books view: {str(e)}')
         return make_response(jsonify({'message': 'Something went wrong!'}), 500)
     
 
+# Reservations
+
+def reservation_to_dict(reservation):
+    return {
+        'id': reservation.id,
+        'user_id': reservation.user_id,
+        'bookcopy_id': reservation.bookcopy_id,
+        'status': reservation.status,
+        'reserved_date': reservation.reserved_date,
+        'return_date': reservation.return_date,
+        'returned_date': reservation.returned_date
+    }
+
+
+def owned_reservation(current_user, reservation_id):
+    reservation = db.session.get(Reservation, reservation_id)
+    if not reservation:
+        return None, make_response(jsonify({'message': 'Reservation not found!'}), 404)
+    if reservation.user_id != current_user.id and not current_user.is_admin:
+        return None, make_response(jsonify({'message': 'Not your reservation!'}), 403)
+    return reservation, None
+
+
+# Reserve a free copy of a book
+@app.route('/reserve-book/<int:book_id>', methods=['POST'])
+@token_required
+def reserve_book(current_user, book_id):
+    try:
+        reservation = reservations.reserve(current_user.id, book_id)
+        if not reservation:
+            # Only looked up when no copy was claimed, so a reservation costs no extra query
+            if db.session.get(Book, book_id) is None:
+                return make_response(jsonify({'message': 'Book not found!'}), 404)
+            return make_response(jsonify({'message': 'No copy available!'}), 409)
+        return make_response(json_response(reservation_to_dict(reservation)), 201)
+    except Exception as e:
+        app.logger.error(f'reserve_book view: {str(e)}')
+        return make_response(jsonify({'message': 'Something went wrong!'}), 500)
+
+
+# Pick up a reserved copy
+@app.route('/borrow-book/<int:reservation_id>', methods=['POST'])
+@token_required
+def borrow_book(current_user, reservation_id):
+    try:
+        reservation, error = owned_reservation(current_user, reservation_id)
+        if error:
+            return error
+        reservation = reservations.borrow(reservation)
+        return json_response(reservation_to_dict(reservation))
+    except reservations.ReservationConflict as e:
+        return make_response(jsonify({'message': str(e)}), 409)
+    except Exception as e:
+        app.logger.error(f'borrow_book view: {str(e)}')
+        return make_response(jsonify({'message': 'Something went wrong!'}), 500)
+
+
+# Return a copy, or cancel a reservation that was never picked up
+@app.route('/return-book/<int:reservation_id>', methods=['POST'])
+@token_required
+def return_book(current_user, reservation_id):
+    try:
+        reservation, error = owned_reservation(current_user, reservation_id)
+        if error:
+            return error
+        reservation = reservations.give_back(reservation)
+        return json_response(reservation_to_dict(reservation))
+    except reservations.ReservationConflict as e:
+        return make_response(jsonify({'message': str(e)}), 409)
+    except Exception as e:
+        app.logger.error(f'return_book view: {str(e)}')
+        return make_response(jsonify({'message': 'Something went wrong!'}), 500)
+
+
+@app.route('/cache-stats', methods=['GET'])
+@token_required
+def cache_stats(current_user):
+    if not current_user or not current_user.is_admin:
+        return make_response(jsonify({'message': 'Admin access required!'}), 403)
+    return jsonify({
+        'genres': genre_cache.stats(),
+        'tokens': token_cache.stats()
+    })
+
+
+@app.route('/pool-stats', methods=['GET'])
+@token_required
+def pool_stats(current_user):
+    if not current_user or not current_user.is_admin:
+        return make_response(jsonify({'message': 'Admin access required!'}), 403)
+    return jsonify(pool.pool_stats(db.engine))
+
+
+@app.route('/slow-queries', methods=['GET'])
+@token_required
+def slow_queries(current_user):
+    if not current_user or not current_user.is_admin:
+        return make_response(jsonify({'message': 'Admin access required!'}), 403)
+    if slow_query_log is None:
+        return jsonify({'enabled': False, 'queries': []})
+    limit = request.args.get('limit', type=int)
+    return jsonify({'enabled': True, **slow_query_log.stats(), 'queries': slow_query_log.recent(limit)})
+
+
 @app.route("/error_route")
 def error():
     1/0  # raises an error
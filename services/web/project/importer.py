@@ -0,0 +1,197 @@
+import csv
+import json
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+
+from . import app, db, search
+from .conditional import bump_catalog_version
+from .models import Book, Genre
+
+
+# Columns a feed row may carry, with the maximum length of string columns
+IMPORT_FIELDS = {
+    'isbn': 20,
+    'title': 100,
+    'authors': 255,
+    'publisher': 100,
+    'publication_date': None,
+    'description': None,
+    'language': 50,
+    'num_pages': None,
+    'cover_image': 255,
+    'genre_id': None,
+}
+REQUIRED_FIELDS = ('isbn', 'title', 'authors')
+
+# Dialects with an upsert statement below
+SUPPORTED_DIALECTS = ('mysql', 'sqlite')
+
+
+class UnsupportedDialect(Exception):
+    pass
+
+
+def read_csv(lines):
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        yield line_number, row
+
+
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else {'__error__': 'Line is not a JSON object'}
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+def validate_row(row, genre_ids):
+    """Return (values, errors) for one feed row.
+
+    `values` only holds the fields the row carries, so an update leaves the
+    others as they are; a field that is present but empty is cleared.
+    """
+    if '__error__' in row:
+        return None, {'row': row['__error__']}
+
+    errors = {}
+    values = {}
+    for field, max_length in IMPORT_FIELDS.items():
+        if field not in row and field not in REQUIRED_FIELDS:
+            continue
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            if field in REQUIRED_FIELDS:
+                errors[field] = f"{field.capitalize()} is required!"
+            values[field] = None
+            continue
+
+        if field == 'publication_date':
+            try:
+                value = date.fromisoformat(str(value))
+            except ValueError:
+                errors[field] = 'Expected a YYYY-MM-DD date'
+        elif field in ('num_pages', 'genre_id'):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                errors[field] = 'Expected an integer'
+            else:
+                if field == 'genre_id' and value not in genre_ids:
+                    errors[field] = 'Unknown genre'
+        else:
+            value = str(value)
+            if max_length and len(value) > max_length:
+                errors[field] = f'Longer than {max_length} characters'
+        values[field] = value
+
+    return (None, errors) if errors else (values, None)
+
+
+def check_dialect():
+    dialect = db.engine.dialect.name
+    if dialect not in SUPPORTED_DIALECTS:
+        raise UnsupportedDialect(f'Bulk import is not supported on {dialect}')
+
+
+def upsert_statement(columns):
+    """Insert rows carrying `columns`, updating only those on a known isbn."""
+    table = Book.__table__
+    update_columns = [column for column in columns if column != 'isbn'] + ['updated_at']
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=['isbn'],
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+    raise UnsupportedDialect(f'Bulk import is not supported on {dialect}')
+
+
+def write_batch(statements, batch):
+    existing = set(db.session.execute(
+        select(Book.isbn).where(Book.isbn.in_(list(batch)))
+    ).scalars())
+    # One executemany per set of columns the rows carry
+    groups = {}
+    for values in batch.values():
+        groups.setdefault(tuple(values), []).append(values)
+    for columns, rows in groups.items():
+        if columns not in statements:
+            statements[columns] = upsert_statement(columns)
+        db.session.execute(statements[columns], rows)
+    search.index_books_by_isbn(list(batch))
+    return len(batch) - len(existing), len(existing)
+
+
+def import_books(lines, fmt, batch_size=None, commit_every=None):
+    """Upsert books from a CSV or NDJSON feed, keyed on isbn.
+
+    Rows are validated one by one and written with one executemany per
+    `batch_size` rows, committing every `commit_every` rows, so memory use
+    does not grow with the size of the feed. Returns a report of inserted,
+    updated and rejected rows; only the first BOOK_IMPORT_MAX_ERRORS
+    rejections are described in it. Raises UnsupportedDialect before
+    reading anything on a database without an upsert statement.
+    """
+    batch_size = batch_size or app.config['BOOK_IMPORT_BATCH_SIZE']
+    commit_every = max(commit_every or app.config['BOOK_IMPORT_COMMIT_EVERY'], batch_size)
+    max_errors = app.config['BOOK_IMPORT_MAX_ERRORS']
+
+    check_dialect()
+    genre_ids = set(db.session.execute(select(Genre.id)).scalars())
+    statements = {}
+    report = {'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+    batch = {}
+    uncommitted = 0
+
+    def flush_batch():
+        nonlocal uncommitted
+        inserted, updated = write_batch(statements, batch)
+        report['inserted'] += inserted
+        report['updated'] += updated
+        uncommitted += len(batch)
+        batch.clear()
+        if uncommitted >= commit_every:
+            commit()
+
+    def commit():
+        nonlocal uncommitted
+        bump_catalog_version(db.session.connection(), 'book')
+        db.session.commit()
+        uncommitted = 0
+
+    try:
+        for line_number, row in READERS[fmt](lines):
+            values, errors = validate_row(row, genre_ids)
+            if errors:
+                report['rejected'] += 1
+                if len(report['errors']) < max_errors:
+                    report['errors'].append({'line': line_number, 'errors': errors})
+                continue
+
+            # A repeated isbn within one batch keeps its last row
+            batch[values['isbn']] = values
+            if len(batch) >= batch_size:
+                flush_batch()
+
+        if batch:
+            flush_batch()
+        if uncommitted:
+            commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return report
@@ -0,0 +1,265 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from flask import g, has_request_context, request
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; one process per log file there
+    fcntl = None
+
+
+# Request fields copied onto every record logged while a request is handled
+REQUEST_FIELDS = ('method', 'route', 'status', 'duration_ms', 'user_id', 'db_queries', 'db_time_ms')
+
+
+class RequestContextFilter(logging.Filter):
+    # Runs on the request thread, where `request` and `g` are still readable
+    def filter(self, record):
+        if has_request_context():
+            record.method = getattr(record, 'method', request.method)
+            rule = request.url_rule
+            record.route = getattr(record, 'route', rule.rule if rule else request.path)
+            record.user_id = getattr(record, 'user_id', g.get('user_id'))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any request fields the record carries."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in REQUEST_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller.
+
+    When the queue is full, records below `keep_level` are dropped. Records at
+    or above it push out the oldest queued record instead, so errors survive
+    a flood of access lines. Every dropped record is counted by level, and
+    passed to `on_drop` by level name if given.
+    """
+
+    def __init__(self, queue, keep_level=logging.WARNING, on_drop=None):
+        super().__init__(queue)
+        self.keep_level = keep_level
+        self.on_drop = on_drop
+        self.dropped = Counter()
+        self.dropped_lock = threading.Lock()
+
+    def count_drop(self, levelname):
+        with self.dropped_lock:
+            self.dropped[levelname] += 1
+        if self.on_drop is not None:
+            self.on_drop(levelname)
+
+    def prepare(self, record):
+        # Only the message is rendered here; JSON encoding and the traceback
+        # layout are left to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if record.levelno < self.keep_level:
+                self.count_drop(record.levelname)
+                return
+        try:
+            evicted = self.queue.get_nowait()
+            self.count_drop(evicted.levelname)
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.count_drop(record.levelname)
+
+    def stats(self):
+        with self.dropped_lock:
+            dropped = dict(self.dropped)
+        return {
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'dropped': dropped,
+            'dropped_total': sum(dropped.values()),
+        }
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """Rotates on the `when` schedule and also whenever the file would pass `max_bytes`.
+
+    A rollover within the same period gets a numbered suffix, e.g.
+    app.log.2024-05-01.1, which backupCount still counts and prunes.
+
+    Every gunicorn worker has its own handler on the same file. Whichever
+    worker is due first rotates it, holding a lock file; the others see the
+    file was replaced and reopen it rather than rotating it again.
+    """
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self.lock_path = self.baseFilename + '.lock'
+
+    def reopen_if_rotated(self):
+        """Follow a rotation done by another process; return whether there was one."""
+        if self.stream is None:
+            return False
+        try:
+            if os.path.samestat(os.stat(self.baseFilename), os.fstat(self.stream.fileno())):
+                return False
+        except FileNotFoundError:
+            pass
+        self.stream.close()
+        self.stream = self._open()
+        self.rolloverAt = self.computeRollover(int(time.time()))
+        return True
+
+    @contextmanager
+    def rollover_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def shouldRollover(self, record):
+        self.reopen_if_rotated()
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        self.stream.seek(0, os.SEEK_END)
+        return self.stream.tell() + len(self.format(record)) + len(self.terminator) > self.max_bytes
+
+    def doRollover(self):
+        with self.rollover_lock():
+            # Another worker may have rotated while this one waited
+            if self.reopen_if_rotated():
+                return
+            super().doRollover()
+
+    def rotation_filename(self, default_name):
+        # Numbered past the highest rollover of the period rather than into a
+        # gap left by pruning, so the numbers keep following age
+        directory, base = os.path.split(default_name)
+        numbers = [int(name[len(base) + 1:]) for name in os.listdir(directory or '.')
+                   if name.startswith(base + '.') and name[len(base) + 1:].isdigit()]
+        if numbers or os.path.exists(default_name):
+            default_name = f'{default_name}.{max(numbers, default=0) + 1}'
+        return super().rotation_filename(default_name)
+
+    def getFilesToDelete(self):
+        # Oldest first by period, then by rollover number; a plain name sort
+        # would put app.log.<date>.10 before app.log.<date>.2
+        directory, base = os.path.split(self.baseFilename)
+        rotated = []
+        for name in os.listdir(directory):
+            period, _, number = name[len(base) + 1:].partition('.')
+            if name.startswith(base + '.') and self.extMatch.match(period) and (not number or number.isdigit()):
+                rotated.append((period, int(number or 0), os.path.join(directory, name)))
+        rotated.sort()
+        return [path for _, _, path in rotated[:max(len(rotated) - self.backupCount, 0)]]
+
+
+def configure(app, on_drop=None):
+    """Route `app.logger` through a bounded queue drained by a background thread.
+
+    `on_drop` is called with the level name of every record dropped because
+    the queue was full. Returns the queue handler; its `stats()` reports
+    queue depth and drops.
+    """
+    config = app.config
+    level = logging.getLevelName(config['LOG_LEVEL'])
+
+    file_handler = SizedTimedRotatingFileHandler(
+        config['LOG_FILE'],
+        max_bytes=config['LOG_MAX_BYTES'],
+        when=config['LOG_ROTATE_WHEN'],
+        backupCount=config['LOG_BACKUP_COUNT'],
+        delay=True,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+    if config['LOG_STDERR']:
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        handlers.append(stream_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(config['LOG_QUEUE_SIZE']), on_drop=on_drop)
+    queue_handler.addFilter(RequestContextFilter())
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+
+    # Nothing writes to a file or stream from the calling thread any more
+    for handler in list(app.logger.handlers):
+        app.logger.removeHandler(handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(level)
+    app.logger.propagate = False
+
+    listener.start()
+    atexit.register(listener.stop)
+    queue_handler.listener = listener
+
+    if config['LOG_ACCESS']:
+        app.before_request(start_timer)
+        app.after_request(log_access(app))
+    return queue_handler
+
+
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+def log_access(app):
+    def after_request(response):
+        started = g.get('request_started')
+        duration_ms = round((time.perf_counter() - started) * 1000, 2) if started else None
+        extra = {'status': response.status_code, 'duration_ms': duration_ms}
+        # Counted by querystats
+        queries = g.get('query_stats')
+        if queries is not None:
+            extra.update(db_queries=queries.count, db_time_ms=queries.milliseconds)
+        app.logger.info(f'{request.method} {request.path} {response.status_code}', extra=extra)
+        return response
+    return after_request
@@ -0,0 +1,140 @@
+import os
+import time
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    disable_created_metrics, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+# With several gunicorn workers each process writes its samples under
+# PROMETHEUS_MULTIPROC_DIR and /metrics adds them up, whichever worker answers
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Requests that match no URL rule share one label instead of one per path
+UNMATCHED = '<unmatched>'
+NO_REQUEST = '<none>'
+
+# Skip the *_created series, they only say when a label set was first seen
+disable_created_metrics()
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests handled.',
+    ['method', 'endpoint', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.',
+    ['method', 'endpoint'],
+    buckets=(.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled.',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+DB_QUERIES = Counter(
+    'db_queries_total', 'SQL statements executed.',
+    ['endpoint']
+)
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Time spent executing a SQL statement.',
+    ['endpoint'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full.',
+    ['level']
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled database connection.',
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 30)
+)
+
+
+# Called as observer(conn, statement, parameters, context, executemany, elapsed)
+# after every timed statement, so querystats and slowlog share this one timer
+query_observers = []
+
+
+class TimedQueuePool(QueuePool):
+    # Covers waiting for a free connection and opening a new one on overflow
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def current_endpoint():
+    if not has_request_context():
+        return NO_REQUEST
+    rule = request.url_rule
+    return rule.rule if rule else UNMATCHED
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which goes away with the statement even
+    # when it raises, rather than on the long-lived pooled connection
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    endpoint = current_endpoint()
+    DB_QUERIES.labels(endpoint).inc()
+    DB_QUERY_LATENCY.labels(endpoint).observe(elapsed)
+    for observer in query_observers:
+        observer(conn, statement, parameters, context, executemany, elapsed)
+
+
+def count_log_drop(levelname):
+    LOG_RECORDS_DROPPED.labels(levelname).inc()
+
+
+def start_request():
+    g.metrics_endpoint = current_endpoint()
+    g.metrics_started = time.perf_counter()
+    IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+
+def record_request(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        endpoint = g.metrics_endpoint
+        REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+        REQUEST_LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - started)
+    return response
+
+
+def finish_request(exc):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        IN_FLIGHT.labels(endpoint).dec()
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.teardown_request(finish_request)
+
+
+def registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def render():
+    """Return the body and content type of a /metrics scrape."""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
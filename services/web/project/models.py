@@ -1,6 +1,7 @@
-from . import db
+from . import db, passwords
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
+from collections import namedtuple
+from werkzeug.security import check_password_hash
 from sqlalchemy import (
     Boolean,
     Column,
@@ -10,7 +11,8 @@ from sqlalchemy import (
     String,
     Numeric,
     Date,
-    Text
+    Text,
+    Index
 )
 from sqlalchemy.orm import relationship
 from flask_sqlalchemy import SQLAlchemy
@@ -18,6 +20,10 @@ from sqlalchemy.sql import func
 
 
 
+# Detached, read-only copy of the fields views need from the logged in user
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'email', 'first_name', 'last_name', 'is_admin', 'active'])
+
+
 class TimestampMixin:
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -54,18 +60,21 @@ class User(db.Model, TimestampMixin):
             raise ValueError("Invalid email format")
 
     def hash_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
         return self.password_hash
 
     def verify_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def snapshot(self):
+        return UserSnapshot(self.id, self.email, self.first_name, self.last_name, self.is_admin, self.active)
+
 
 class Profile(db.Model, TimestampMixin):
     __tablename__ = 'profile'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('user.id'))
+    user_id = Column(Integer, ForeignKey('user.id'), index=True)
     user = relationship("User", back_populates="profile")
     cover_image = Column(String(255), nullable=True)
     mobile_number = Column(String(20), nullable=False)
@@ -92,11 +101,22 @@ class Book(db.Model, TimestampMixin):
     language = Column(String(50))
     num_pages = Column(Integer)
     cover_image = Column(String(255))
-    genre_id = Column(Integer, ForeignKey('genre.id'))
+    genre_id = Column(Integer, ForeignKey('genre.id'), index=True)
+    # Denormalized from bookcopy, kept in step by project.availability
+    total_copies = Column(Integer, nullable=False, default=0, server_default='0')
+    available_copies = Column(Integer, nullable=False, default=0, server_default='0')
+    # Moved by every counter change, in place of the book catalog version,
+    # so conditional GETs notice availability without a shared hot row
+    copies_version = Column(Integer, nullable=False, default=0, server_default='0')
+    copies_changed_at = Column(DateTime, nullable=True)
 
 
 class BookCopy(db.Model, TimestampMixin):
     __tablename__ = 'bookcopy'
+    __table_args__ = (
+        # Copies of a book, and its free copies when claiming one
+        Index('ix_bookcopy_book_id_availability', 'book_id', 'availability'),
+    )
 
     id = Column(Integer, primary_key=True)
     book_id = Column(Integer, ForeignKey('book.id'))
@@ -111,7 +131,7 @@ class BookRequest(db.Model, TimestampMixin):
     __tablename__ = 'bookrequest'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('user.id'))
+    user_id = Column(Integer, ForeignKey('user.id'), index=True)
     requested_title = Column(String(100), nullable=False)
     requested_authors = Column(String(255), nullable=False)
     requested_publisher = Column(String(100))
@@ -122,25 +142,33 @@ class Review(db.Model, TimestampMixin):
     __tablename__ = 'review'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('user.id'))
-    book_id = Column(Integer, ForeignKey('book.id'))
+    user_id = Column(Integer, ForeignKey('user.id'), index=True)
+    book_id = Column(Integer, ForeignKey('book.id'), index=True)
     review_text = Column(String(255), nullable=False)
 
 
 class Bookmark(db.Model, TimestampMixin):
     __tablename__ = 'bookmark'
-    
+    __table_args__ = (
+        # A user bookmarks a book once; also serves a user's bookmark list
+        Index('ix_bookmark_user_id_book_id', 'user_id', 'book_id', unique=True),
+    )
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('user.id'))
-    book_id = Column(Integer, ForeignKey('book.id'))
+    book_id = Column(Integer, ForeignKey('book.id'), index=True)
 
 
 class Reservation(db.Model, TimestampMixin):
     __tablename__ = 'reservation'
+    __table_args__ = (
+        # A user's reservations, optionally in one status
+        Index('ix_reservation_user_id_status', 'user_id', 'status'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('user.id'))
-    bookcopy_id = Column(Integer, ForeignKey('bookcopy.id'))
+    bookcopy_id = Column(Integer, ForeignKey('bookcopy.id'), index=True)
     reserved_date = Column(Date, default=func.now())
     return_date = Column(Date, nullable=True)
     returned_date = Column(Date, nullable=True)
@@ -154,8 +182,8 @@ class Transaction(db.Model, TimestampMixin):
     __tablename__ = 'transaction'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('user.id'))
-    reservation_id = Column(Integer, ForeignKey('reservation.id'))
+    user_id = Column(Integer, ForeignKey('user.id'), index=True)
+    reservation_id = Column(Integer, ForeignKey('reservation.id'), index=True)
     transaction_date = Column(Date, default=func.now())
     amount = Column(Numeric(10, 2), nullable=False)
     payment_method = Column(String(50), nullable=False)
@@ -164,6 +192,10 @@ class Transaction(db.Model, TimestampMixin):
     # reservation = relationship("Reservation", back_populates="transaction")
 
 
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
 
-
-
+    # One row per cached collection ("book", "genre"), bumped on every write
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
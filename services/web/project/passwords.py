@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from . import app
+
+
+class VerifierBusy(Exception):
+    """Too many password checks are already running or waiting."""
+
+
+# Password KDFs are deliberately slow; running them in a small pool caps how
+# much of the worker a burst of logins can take from every other request
+executor = ThreadPoolExecutor(
+    max_workers=app.config['LOGIN_MAX_CONCURRENCY'],
+    thread_name_prefix='password-verify'
+)
+pending = threading.BoundedSemaphore(
+    app.config['LOGIN_MAX_CONCURRENCY'] + app.config['LOGIN_MAX_QUEUED']
+)
+
+_method_prefix = None
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
+
+
+def current_method_prefix():
+    # "scrypt" is stored as "scrypt:32768:8:1", so compare against the
+    # prefix the configured method actually writes
+    global _method_prefix
+    if _method_prefix is None:
+        _method_prefix = hash_password('').split('$', 1)[0]
+    return _method_prefix
+
+
+def needs_rehash(pwhash):
+    return pwhash.split('$', 1)[0] != current_method_prefix()
+
+
+def run_bounded(fn, *args):
+    if not pending.acquire(blocking=False):
+        raise VerifierBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except Exception:
+        pending.release()
+        raise
+    # The slot is only freed once the KDF is really done, even if we gave up
+    future.add_done_callback(lambda _: pending.release())
+    try:
+        return future.result(timeout=app.config['LOGIN_VERIFY_TIMEOUT'])
+    except TimeoutError:
+        raise VerifierBusy()
+
+
+def verify_password(pwhash, password):
+    """Check a password in the bounded pool; raises VerifierBusy when full."""
+    return run_bounded(check_password_hash, pwhash, password)
+
+
+def rehash_password(password):
+    return run_bounded(hash_password, password)
@@ -0,0 +1,72 @@
+import threading
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from .cache import TTLCache
+from .metrics import TimedQueuePool
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    In-memory SQLite keeps one connection per thread and takes none of the
+    queue pool settings, so it keeps the dialect's own pool.
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {
+        # Times checkouts for /metrics
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            timeout=pool.timeout()
+        )
+    return stats
+
+
+class ReadinessCheck:
+    """Runs SELECT 1 at most once per `ttl` seconds and remembers the outcome.
+
+    Load balancers poll readiness constantly; between checks they get the
+    cached answer, and a burst of polls after expiry runs a single query.
+    """
+
+    def __init__(self, engine_getter, ttl):
+        self.engine_getter = engine_getter
+        self.result = TTLCache(maxsize=1, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        """Return (ready, error message or None)."""
+        cached = self.result.get('database')
+        if cached is not None:
+            return cached
+        with self.lock:
+            cached = self.result.get('database')
+            if cached is not None:
+                return cached
+            try:
+                with self.engine_getter().connect() as connection:
+                    connection.execute(text('SELECT 1'))
+                outcome = (True, None)
+            except Exception as e:
+                outcome = (False, str(e))
+            self.result.set('database', outcome)
+            return outcome
@@ -0,0 +1,76 @@
+from flask import current_app, g, has_request_context, request
+
+from . import metrics
+
+
+class QueryStats:
+    """Statements run and seconds spent in the database by one request."""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def milliseconds(self):
+        return round(self.seconds * 1000, 2)
+
+
+def current():
+    """The QueryStats of the request being handled, or None outside of one."""
+    return g.get('query_stats') if has_request_context() else None
+
+
+def count_query(conn, statement, parameters, context, executemany, elapsed):
+    stats = current()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+# Statements are timed once, by metrics
+metrics.query_observers.append(count_query)
+
+
+def query_budget(limit):
+    """Declare how many queries a view may run per request.
+
+    Goes right under @app.route. Views without one get QUERY_BUDGET.
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+def budget_for_request():
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', current_app.config['QUERY_BUDGET'])
+
+
+def start_request():
+    g.query_stats = QueryStats()
+
+
+def report_request(response):
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    budget = budget_for_request()
+    if current_app.debug or current_app.config['QUERY_STATS_HEADERS']:
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['X-DB-Time-Ms'] = str(stats.milliseconds)
+        response.headers['X-DB-Query-Budget'] = str(budget)
+    if stats.count > budget:
+        # Usually a lazy load inside a loop
+        current_app.logger.warning(
+            f'{request.method} {request.path} ran {stats.count} queries, over its budget of {budget}',
+            extra={'db_queries': stats.count, 'db_time_ms': stats.milliseconds}
+        )
+    return response
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(report_request)
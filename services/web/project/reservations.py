@@ -0,0 +1,122 @@
+import random
+from datetime import date, timedelta
+from sqlalchemy import select
+
+from . import app, db
+from .availability import adjust_counters
+from .models import BookCopy, Reservation
+
+
+RESERVED = 'reserved'
+BORROWED = 'borrowed'
+RETURNED = 'returned'
+
+bookcopy_table = BookCopy.__table__
+reservation_table = Reservation.__table__
+
+
+class ReservationConflict(Exception):
+    """The reservation is not in a state that allows the transition."""
+
+
+def claim_copy(book_id):
+    """Mark one free copy of `book_id` as taken and return its id, or None.
+
+    On MySQL the candidate row is locked with FOR UPDATE SKIP LOCKED, so
+    concurrent claims walk past each other's rows instead of queueing. The
+    claim itself is a conditional UPDATE on `availability`, which is what
+    keeps two requests from getting the same copy on every dialect; a lost
+    race just moves on to the next candidate.
+    """
+    skip_locked = db.engine.dialect.name == 'mysql'
+    candidates = 1 if skip_locked else app.config['RESERVATION_CLAIM_CANDIDATES']
+
+    for _ in range(app.config['RESERVATION_CLAIM_ATTEMPTS']):
+        query = select(bookcopy_table.c.id)\
+            .where(bookcopy_table.c.book_id == book_id, bookcopy_table.c.availability.is_(True))\
+            .order_by(bookcopy_table.c.id)\
+            .limit(candidates)
+        if skip_locked:
+            query = query.with_for_update(skip_locked=True)
+        copy_ids = db.session.execute(query).scalars().all()
+        if not copy_ids:
+            return None
+
+        # Spread concurrent claimers over the free copies
+        random.shuffle(copy_ids)
+        for copy_id in copy_ids:
+            result = db.session.execute(
+                bookcopy_table.update()
+                .where(bookcopy_table.c.id == copy_id, bookcopy_table.c.availability.is_(True))
+                .values(availability=False)
+            )
+            if result.rowcount == 1:
+                adjust_counters(db.session.connection(), book_id, available=-1)
+                return copy_id
+    return None
+
+
+def reserve(user_id, book_id):
+    """Reserve a free copy of a book for a user, or return None if none is free."""
+    try:
+        copy_id = claim_copy(book_id)
+        if copy_id is None:
+            db.session.rollback()
+            return None
+        reservation = Reservation(
+            user_id=user_id,
+            bookcopy_id=copy_id,
+            reserved_date=date.today(),
+            status=RESERVED
+        )
+        db.session.add(reservation)
+        db.session.commit()
+        return reservation
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def transition(reservation, from_statuses, **values):
+    # Compare-and-set on status so two concurrent calls cannot both succeed
+    result = db.session.execute(
+        reservation_table.update()
+        .where(reservation_table.c.id == reservation.id, reservation_table.c.status.in_(from_statuses))
+        .values(**values)
+    )
+    if result.rowcount != 1:
+        raise ReservationConflict(f'Reservation {reservation.id} is not {" or ".join(from_statuses)}')
+
+
+def borrow(reservation):
+    return_date = date.today() + timedelta(days=app.config['RESERVATION_LOAN_DAYS'])
+    try:
+        transition(reservation, [RESERVED], status=BORROWED, return_date=return_date)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.refresh(reservation)
+    return reservation
+
+
+def give_back(reservation):
+    """Close a reservation, borrowed or not, and free its copy."""
+    try:
+        transition(reservation, [RESERVED, BORROWED], status=RETURNED, returned_date=date.today())
+        freed = db.session.execute(
+            bookcopy_table.update()
+            .where(bookcopy_table.c.id == reservation.bookcopy_id, bookcopy_table.c.availability.is_(False))
+            .values(availability=True)
+        )
+        if freed.rowcount == 1:
+            book_id = db.session.execute(
+                select(bookcopy_table.c.book_id).where(bookcopy_table.c.id == reservation.bookcopy_id)
+            ).scalar()
+            adjust_counters(db.session.connection(), book_id, available=1)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    db.session.refresh(reservation)
+    return reservation
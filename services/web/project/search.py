@@ -0,0 +1,116 @@
+import re
+from sqlalchemy import DDL, bindparam, event, text
+
+from . import db
+from .models import Book
+
+
+# Full-text index over the searchable book columns. MySQL keeps a FULLTEXT
+# index on the book table itself; SQLite keeps an FTS5 table keyed by book id
+# which is written alongside the book rows.
+FTS_TABLE = 'book_fts'
+MYSQL_INDEX = 'ix_book_fulltext'
+
+event.listen(
+    Book.__table__, 'after_create',
+    DDL(f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(title, isbn, authors)')
+    .execute_if(dialect='sqlite')
+)
+event.listen(
+    Book.__table__, 'after_create',
+    DDL(f'CREATE FULLTEXT INDEX {MYSQL_INDEX} ON book (title, isbn, authors)')
+    .execute_if(dialect='mysql')
+)
+event.listen(
+    Book.__table__, 'before_drop',
+    DDL(f'DROP TABLE IF EXISTS {FTS_TABLE}').execute_if(dialect='sqlite')
+)
+
+
+def dialect_name():
+    return db.engine.dialect.name
+
+
+def search_terms(keyword):
+    return re.findall(r'\w+', keyword or '')
+
+
+def index_book(book):
+    # MySQL maintains its FULLTEXT index itself, only FTS5 needs writing
+    if dialect_name() != 'sqlite':
+        return
+    remove_book(book.id)
+    db.session.execute(
+        text(f'INSERT INTO {FTS_TABLE} (rowid, title, isbn, authors) VALUES (:id, :title, :isbn, :authors)'),
+        {'id': book.id, 'title': book.title, 'isbn': book.isbn, 'authors': book.authors}
+    )
+
+
+def remove_book(book_id):
+    if dialect_name() != 'sqlite':
+        return
+    db.session.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': book_id})
+
+
+def index_books_by_isbn(isbns):
+    # Bulk writes bypass the ORM, so their rows are re-indexed by isbn
+    if dialect_name() != 'sqlite' or not isbns:
+        return
+    db.session.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM book WHERE isbn IN :isbns)')
+                       .bindparams(bindparam('isbns', expanding=True)), {'isbns': isbns})
+    db.session.execute(text(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, isbn, authors) '
+        f'SELECT id, title, isbn, authors FROM book WHERE isbn IN :isbns'
+    ).bindparams(bindparam('isbns', expanding=True)), {'isbns': isbns})
+
+
+def rebuild_index():
+    if dialect_name() != 'sqlite':
+        return
+    db.session.execute(text(f'DELETE FROM {FTS_TABLE}'))
+    db.session.execute(text(
+        f'INSERT INTO {FTS_TABLE} (rowid, title, isbn, authors) SELECT id, title, isbn, authors FROM book'
+    ))
+    db.session.commit()
+
+
+def ranked_book_ids(keyword, limit, offset=0):
+    """Return the ids of the books matching `keyword`, most relevant first.
+
+    Every term of the keyword has to match, and the last one is matched as
+    a prefix so that search-as-you-type keeps working.
+    """
+    terms = search_terms(keyword)
+    if not terms:
+        return []
+
+    dialect = dialect_name()
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{term}"' for term in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        rows = db.session.execute(
+            text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match '
+                 f'ORDER BY bm25({FTS_TABLE}) LIMIT :limit OFFSET :offset'),
+            {'match': match, 'limit': limit, 'offset': offset}
+        )
+    elif dialect == 'mysql':
+        match = ' '.join(f'+{term}' for term in terms) + '*'
+        rows = db.session.execute(
+            text('SELECT id FROM book WHERE MATCH (title, isbn, authors) AGAINST (:match IN BOOLEAN MODE) '
+                 'ORDER BY MATCH (title, isbn, authors) AGAINST (:match IN BOOLEAN MODE) DESC '
+                 'LIMIT :limit OFFSET :offset'),
+            {'match': match, 'limit': limit, 'offset': offset}
+        )
+    else:
+        return like_book_ids(keyword, limit, offset)
+    return [row[0] for row in rows]
+
+
+def like_book_ids(keyword, limit, offset=0):
+    # Unranked substring scan, kept for dialects without a full-text index
+    books = db.session.query(Book.id).filter(
+        (Book.title.ilike(f'%{keyword}%')) |
+        (Book.isbn.ilike(f'%{keyword}%')) |
+        (Book.authors.ilike(f'%{keyword}%'))
+    ).order_by(Book.id).limit(limit).offset(offset)
+    return [row.id for row in books]
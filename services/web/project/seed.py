@@ -0,0 +1,327 @@
+import bisect
+import itertools
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, time as day_time, timedelta
+from decimal import Decimal
+from sqlalchemy import func, select, text
+
+from . import app, db, passwords, search
+from .conditional import bump_catalog_version
+from .models import Book, BookCopy, Bookmark, Genre, Profile, Reservation, Review, Transaction, User
+from .reservations import BORROWED, RESERVED, RETURNED
+
+
+SEED_PASSWORD = 'password'
+LOAN_DAYS = 14
+FINE_PER_DAY = Decimal('0.50')
+
+WORDS = (
+    'river', 'night', 'garden', 'stone', 'winter', 'silver', 'empire', 'shadow', 'ocean', 'letters',
+    'city', 'forest', 'machine', 'history', 'light', 'house', 'storm', 'island', 'mirror', 'golden',
+    'secret', 'summer', 'kingdom', 'glass', 'journey', 'fire', 'memory', 'north', 'paper', 'song',
+)
+FIRST_NAMES = ('Aarav', 'Maya', 'Liam', 'Sita', 'Noah', 'Anjali', 'Emma', 'Ravi', 'Olivia', 'Kiran', 'Lucas', 'Asha')
+LAST_NAMES = ('Shrestha', 'Smith', 'Gurung', 'Garcia', 'Thapa', 'Müller', 'Rai', 'Brown', 'Karki', 'Rossi')
+GENRES = ('Fiction', 'Mystery', 'Science Fiction', 'Fantasy', 'Biography', 'History', 'Poetry', 'Romance',
+          'Travel', 'Science', 'Philosophy', 'Children', 'Thriller', 'Horror', 'Cooking', 'Art')
+LANGUAGES = ('English', 'English', 'English', 'Nepali', 'Hindi', 'French', 'Spanish', 'German')
+BOOK_TYPES = ('Paperback', 'Hardcover', 'Paperback', 'Ebook')
+CONDITIONS = ('New', 'Good', 'Good', 'Worn')
+PAYMENT_METHODS = ('cash', 'card', 'esewa', 'khalti')
+
+
+class Zipf:
+    """Draws indexes 0..n-1 with P(rank k) proportional to 1 / k**s.
+
+    The rank order is shuffled once, so the popular items are spread over
+    the id range rather than being the first rows inserted.
+    """
+
+    def __init__(self, n, s, rng):
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+        self.total = self.cum_weights[-1]
+        self.order = list(range(n))
+        rng.shuffle(self.order)
+        self.rng = rng
+
+    def draw(self):
+        rank = bisect.bisect_left(self.cum_weights, self.rng.random() * self.total)
+        return self.order[min(rank, len(self.order) - 1)]
+
+
+@contextmanager
+def bulk_load_connection():
+    """A connection with the checks and durability a bulk load can do without.
+
+    The settings are put back before the connection returns to the pool.
+    """
+    with db.engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == 'sqlite':
+            synchronous = connection.execute(text('PRAGMA synchronous')).scalar()
+            connection.execute(text('PRAGMA synchronous = OFF'))
+        elif dialect == 'mysql':
+            checks = connection.execute(text('SELECT @@unique_checks, @@foreign_key_checks')).one()
+            connection.execute(text('SET unique_checks = 0, foreign_key_checks = 0'))
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            if dialect == 'sqlite':
+                connection.execute(text(f'PRAGMA synchronous = {int(synchronous)}'))
+            elif dialect == 'mysql':
+                connection.execute(text('SET unique_checks = :unique_checks, foreign_key_checks = :foreign_key_checks'),
+                                   {'unique_checks': checks[0], 'foreign_key_checks': checks[1]})
+            connection.commit()
+
+
+def max_id(connection, table):
+    return connection.execute(select(func.max(table.c.id))).scalar() or 0
+
+
+def insert_rows(connection, table, rows, batch_size):
+    """Insert `rows` in executemany batches and return the new ids, in order."""
+    before = max_id(connection, table)
+    count = 0
+    for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+        connection.execute(table.insert(), batch)
+        count += len(batch)
+    connection.commit()
+    if not count:
+        return []
+    return connection.execute(select(table.c.id).where(table.c.id > before).order_by(table.c.id)).scalars().all()
+
+
+def random_moment(rng, day):
+    return datetime.combine(day, day_time(rng.randrange(8, 20), rng.randrange(60), rng.randrange(60)))
+
+
+def seed(users=1000, genres=16, books=100000, copies=300000, reservations=1000000, reviews=200000,
+         bookmarks=200000, transactions=50000, book_zipf=1.1, user_zipf=0.8, years=3,
+         open_fraction=0.05, random_seed=1, today=None, batch_size=None):
+    """Fill the database with a synthetic catalog and its history.
+
+    Book popularity follows a Zipf law with exponent `book_zipf`: popular
+    books get more copies, reservations, reviews and bookmarks. Reader
+    activity follows a Zipf law with exponent `user_zipf`. Reservations
+    are spread over the last `years` years. About `open_fraction` of them
+    are still open, at most one per copy, and those copies are marked
+    unavailable. Given the same arguments and `today`, an empty database
+    always ends up with the same rows, password salts aside.
+
+    Returns the number of rows written per table and the time taken.
+    """
+    started = time.perf_counter()
+    rng = random.Random(random_seed)
+    today = today or date.today()
+    batch_size = batch_size or app.config['SEED_BATCH_SIZE']
+    first_day = today - timedelta(days=365 * years)
+    history_days = (today - first_day).days
+    report = {}
+
+    with bulk_load_connection() as connection:
+        # Everyone shares one hash; hashing per user would dominate the run
+        password_hash = passwords.hash_password(SEED_PASSWORD)
+        user_base = max_id(connection, User.__table__)
+
+        def user_rows():
+            for n in range(users):
+                joined = random_moment(rng, first_day + timedelta(days=rng.randrange(history_days)))
+                yield {
+                    'email': f'user{user_base + n}@seed.example.com',
+                    'first_name': rng.choice(FIRST_NAMES),
+                    'last_name': rng.choice(LAST_NAMES),
+                    'password_hash': password_hash,
+                    'is_admin': False,
+                    'active': rng.random() > 0.02,
+                    'created_at': joined,
+                    'updated_at': joined,
+                }
+        user_ids = insert_rows(connection, User.__table__, user_rows(), batch_size)
+        report['user'] = len(user_ids)
+
+        def profile_rows():
+            for user_id in user_ids:
+                moment = random_moment(rng, first_day + timedelta(days=rng.randrange(history_days)))
+                yield {
+                    'user_id': user_id,
+                    'mobile_number': f'98{rng.randrange(10 ** 8):08d}',
+                    'address': f'{rng.randrange(1, 999)} {rng.choice(WORDS).title()} Marg',
+                    'created_at': moment,
+                    'updated_at': moment,
+                }
+        report['profile'] = len(insert_rows(connection, Profile.__table__, profile_rows(), batch_size))
+
+        moment = random_moment(rng, first_day)
+        genre_ids = insert_rows(connection, Genre.__table__, (
+            {'name': GENRES[n] if n < len(GENRES) else f'{GENRES[n % len(GENRES)]} {n // len(GENRES)}',
+             'created_at': moment, 'updated_at': moment}
+            for n in range(genres)
+        ), batch_size)
+        report['genre'] = len(genre_ids)
+
+        book_popularity = Zipf(books, book_zipf, rng) if books else None
+        reader_activity = Zipf(len(user_ids), user_zipf, rng) if user_ids else None
+
+        # Copies: one per book, the rest follow popularity
+        copy_books = [n if n < books else book_popularity.draw() for n in range(copies)] if books else []
+        copies_of = [[] for _ in range(books)]
+        for copy_index, book_index in enumerate(copy_books):
+            copies_of[book_index].append(copy_index)
+
+        # With fewer copies than books some books have none; redraw until one has
+        def draw_copy():
+            while True:
+                book_copies = copies_of[book_popularity.draw()]
+                if book_copies:
+                    return rng.choice(book_copies)
+
+        # Open reservations hold a copy each; popular books are the ones out
+        open_count = min(int(reservations * open_fraction), len(copy_books)) if user_ids else 0
+        open_copies = set()
+        for _ in range(open_count * 20):
+            if len(open_copies) == open_count:
+                break
+            open_copies.add(draw_copy())
+        if len(open_copies) < open_count:
+            open_copies.update(rng.sample([c for c in range(len(copy_books)) if c not in open_copies],
+                                          open_count - len(open_copies)))
+        open_copies = sorted(open_copies)
+        out = set(open_copies)
+
+        book_base = max_id(connection, Book.__table__)
+
+        def book_rows():
+            for n in range(books):
+                published = date(1900, 1, 1) + timedelta(days=rng.randrange(125 * 365))
+                added = random_moment(rng, first_day + timedelta(days=rng.randrange(history_days)))
+                total = len(copies_of[n])
+                yield {
+                    'isbn': f'979{book_base + n:010d}',
+                    'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(1, 5))).title(),
+                    'authors': ', '.join(f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+                                         for _ in range(1 if rng.random() < 0.85 else 2)),
+                    'publisher': f'{rng.choice(WORDS).title()} Press',
+                    'publication_date': published,
+                    'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(20, 120))).capitalize(),
+                    'language': rng.choice(LANGUAGES),
+                    'num_pages': rng.randrange(48, 1200),
+                    'genre_id': rng.choice(genre_ids) if genre_ids else None,
+                    'total_copies': total,
+                    'available_copies': total - sum(copy in out for copy in copies_of[n]),
+                    'created_at': added,
+                    'updated_at': added,
+                }
+        book_ids = insert_rows(connection, Book.__table__, book_rows(), batch_size)
+        report['book'] = len(book_ids)
+
+        def copy_rows():
+            for copy_index, book_index in enumerate(copy_books):
+                bought = random_moment(rng, first_day + timedelta(days=rng.randrange(history_days)))
+                yield {
+                    'book_id': book_ids[book_index],
+                    'book_type': rng.choice(BOOK_TYPES),
+                    'edition': f'{rng.randrange(1, 6)}',
+                    'condition': rng.choice(CONDITIONS),
+                    'price': Decimal(rng.randrange(300, 5000)) / 100,
+                    'availability': copy_index not in out,
+                    'created_at': bought,
+                    'updated_at': bought,
+                }
+        copy_ids = insert_rows(connection, BookCopy.__table__, copy_rows(), batch_size)
+        report['bookcopy'] = len(copy_ids)
+
+        # Who reserved, when it closed and the fine owed, for the payments below
+        reservation_users = array('l')
+        reservation_days = array('l')
+        reservation_fines = array('l')
+
+        def reservation_rows():
+            for n in range(reservations if user_ids and copy_ids else 0):
+                if n < len(open_copies):
+                    copy_index = open_copies[n]
+                    status = rng.choice((RESERVED, BORROWED))
+                    reserved = today - timedelta(days=rng.randrange(LOAN_DAYS + 7))
+                    returned, fine = None, None
+                else:
+                    copy_index = draw_copy()
+                    status = RETURNED
+                    reserved = first_day + timedelta(days=rng.randrange(history_days))
+                    returned = reserved + timedelta(days=rng.randrange(1, LOAN_DAYS + 10))
+                    late_days = (returned - reserved).days - LOAN_DAYS
+                    fine = FINE_PER_DAY * late_days if late_days > 0 else None
+                moment = random_moment(rng, reserved)
+                user_id = user_ids[reader_activity.draw()]
+                reservation_users.append(user_id)
+                reservation_days.append((returned or reserved).toordinal())
+                reservation_fines.append(int(fine * 100) if fine else 0)
+                yield {
+                    'user_id': user_id,
+                    'bookcopy_id': copy_ids[copy_index],
+                    'reserved_date': reserved,
+                    'return_date': reserved + timedelta(days=LOAN_DAYS) if status != RESERVED else None,
+                    'returned_date': returned,
+                    'status': status,
+                    'fine': fine,
+                    'created_at': moment,
+                    'updated_at': moment,
+                }
+        reservation_ids = insert_rows(connection, Reservation.__table__, reservation_rows(), batch_size)
+        report['reservation'] = len(reservation_ids)
+
+        def review_rows():
+            for _ in range(reviews if user_ids and book_ids else 0):
+                moment = random_moment(rng, first_day + timedelta(days=rng.randrange(history_days)))
+                yield {
+                    'user_id': user_ids[reader_activity.draw()],
+                    'book_id': book_ids[book_popularity.draw()],
+                    'review_text': ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(5, 40)))[:255].capitalize(),
+                    'created_at': moment,
+                    'updated_at': moment,
+                }
+        report['review'] = len(insert_rows(connection, Review.__table__, review_rows(), batch_size))
+
+        # A reader bookmarks a book once; bounded attempts keep small catalogs finite
+        def bookmark_rows():
+            seen = set()
+            attempts = 0
+            while len(seen) < bookmarks and attempts < bookmarks * 5 and user_ids and book_ids:
+                attempts += 1
+                pair = (user_ids[reader_activity.draw()], book_ids[book_popularity.draw()])
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                moment = random_moment(rng, first_day + timedelta(days=rng.randrange(history_days)))
+                yield {'user_id': pair[0], 'book_id': pair[1], 'created_at': moment, 'updated_at': moment}
+        report['bookmark'] = len(insert_rows(connection, Bookmark.__table__, bookmark_rows(), batch_size))
+
+        # Payments are fines where one was owed, and otherwise rental fees
+        def transaction_rows():
+            for _ in range(transactions if reservation_ids else 0):
+                index = rng.randrange(len(reservation_ids))
+                day = date.fromordinal(reservation_days[index])
+                moment = random_moment(rng, day)
+                yield {
+                    'user_id': reservation_users[index],
+                    'reservation_id': reservation_ids[index],
+                    'transaction_date': day,
+                    'amount': Decimal(reservation_fines[index] or rng.randrange(50, 500)) / 100,
+                    'payment_method': rng.choice(PAYMENT_METHODS),
+                    'remarks': 'Late fine' if reservation_fines[index] else 'Rental fee',
+                    'created_at': moment,
+                    'updated_at': moment,
+                }
+        report['transaction'] = len(insert_rows(connection, Transaction.__table__, transaction_rows(), batch_size))
+
+    # Bulk inserts skip the ORM, so caches and the search index are told here
+    connection = db.session.connection()
+    bump_catalog_version(connection, 'book')
+    bump_catalog_version(connection, 'genre')
+    db.session.commit()
+    search.rebuild_index()
+
+    report['seconds'] = round(time.perf_counter() - started, 1)
+    return report
@@ -1,4 +1,8 @@
-from flask import jsonify, make_response
+from flask import jsonify, make_response, Response
+from sqlalchemy import select
+
+from .encoding import dumps
+from .models import Book
 
 
 class UserRegistrationSerializer:
@@ -19,4 +23,42 @@ class UserRegistrationSerializer:
         errors = self.validate()
         if errors:
             return False, errors
-        return True, self.data
\ No newline at end of file
+        return True, self.data
+
+# Columns returned by the book endpoints. Selecting them as plain rows skips
+# ORM hydration and the identity map, which dominates large listings.
+BOOK_FIELDS = (
+    'id', 'isbn', 'title', 'authors', 'publisher', 'publication_date',
+    'description', 'language', 'num_pages', 'cover_image', 'genre_id',
+    'total_copies', 'available_copies'
+)
+
+
+def book_fields(value):
+    """Parse a ?fields= parameter into the BOOK_FIELDS it names, in order.
+
+    No value means every field; an unknown name raises ValueError.
+    """
+    if value is None:
+        return BOOK_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}!')
+    if not fields:
+        raise ValueError('Fields must name at least one field!')
+    return fields
+
+
+def book_select(fields=BOOK_FIELDS, *keys):
+    # `keys` are columns the view needs itself, such as id for the cursor;
+    # they are selected but left out of book_to_dict unless asked for
+    return select(*(getattr(Book, field) for field in dict.fromkeys((*fields, *keys))))
+
+
+def book_to_dict(row, fields=BOOK_FIELDS):
+    return {field: getattr(row, field) for field in fields}
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
@@ -0,0 +1,173 @@
+import os
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from flask import current_app, has_request_context, request
+
+from . import metrics
+from .cache import TTLCache
+from .metrics import current_endpoint
+
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Statements whose plan EXPLAIN can show without running them
+EXPLAINABLE = ('select', 'with', 'update', 'delete')
+
+# Longer parameter values are cut to this many characters
+MAX_PARAMETER_LENGTH = 200
+
+
+def shorten(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= MAX_PARAMETER_LENGTH else text[:MAX_PARAMETER_LENGTH] + '...'
+
+
+def summarize_parameters(parameters, executemany):
+    if executemany:
+        # The first row stands in for the batch
+        return {'rows': len(parameters), 'first': summarize_parameters(parameters[0], False) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: shorten(value) for key, value in parameters.items()}
+    return [shorten(value) for value in parameters or ()]
+
+
+def stack_summary(limit=8):
+    """The innermost project frames that led to the statement."""
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(PROJECT_DIR) and frame.filename != __file__
+    ]
+    return [
+        f'{os.path.relpath(frame.filename, os.path.dirname(PROJECT_DIR))}:{frame.lineno} in {frame.name}'
+        for frame in frames[-limit:]
+    ]
+
+
+def explain(conn, statement, parameters):
+    """Return the EXPLAIN rows for `statement`, or None if there are none to get.
+
+    Only MySQL and SQLite are handled. The EXPLAIN goes straight to the DBAPI
+    connection, out of sight of the engine events.
+    """
+    dialect = conn.dialect.name
+    if dialect not in ('mysql', 'sqlite') or not statement.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        return [{'error': str(e)}]
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """Keeps the last `size` statements that took at least `threshold_ms`.
+
+    Each entry records the parameters, the endpoint and the project frames
+    that ran the statement, plus its EXPLAIN output. Plans are fetched when
+    the log is read, on a pooled connection of their own: the statement's
+    connection may still hold unread rows of a streamed result, which an
+    EXPLAIN there would silently discard. They are cached per statement text
+    for a few minutes. Every worker process keeps its own log.
+    """
+
+    def __init__(self, threshold_ms, size=200, explain=True):
+        self.threshold = threshold_ms / 1000
+        self.entries = deque(maxlen=size)
+        self.explain = explain
+        self.plans = TTLCache(maxsize=256, ttl=300)
+        self.recorded = 0
+        self.engine = None
+        self.lock = threading.Lock()
+
+    def attach(self, engine):
+        # Statements are timed once, by metrics; this only looks at the ones
+        # `engine` ran
+        self.engine = engine
+        metrics.query_observers.append(self.check)
+
+    def detach(self, engine):
+        metrics.query_observers.remove(self.check)
+        self.engine = None
+
+    def check(self, conn, statement, parameters, context, executemany, elapsed):
+        if elapsed < self.threshold or conn.engine is not self.engine:
+            return
+
+        entry = {
+            'at': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'duration_ms': round(elapsed * 1000, 2),
+            'endpoint': current_endpoint(),
+            'method': request.method if has_request_context() else None,
+            'statement': statement,
+            'parameters': summarize_parameters(parameters, executemany),
+            'stack': stack_summary(),
+            'explain': None,
+        }
+        # [entry, parameters still to EXPLAIN with, or None]
+        record = [entry, None if executemany or not self.explain else parameters]
+        with self.lock:
+            self.entries.append(record)
+            self.recorded += 1
+        if has_request_context():
+            current_app.logger.warning(
+                f'Slow query, {entry["duration_ms"]} ms in {entry["endpoint"]}: {statement[:MAX_PARAMETER_LENGTH]}'
+            )
+
+    def plan(self, conn, statement, parameters):
+        plan = self.plans.get(statement)
+        if plan is None:
+            plan = explain(conn, statement, parameters)
+            self.plans.set(statement, plan)
+        return plan
+
+    def explain_pending(self, records):
+        pending = [record for record in records if record[1] is not None]
+        if not pending or self.engine is None:
+            return
+        with self.engine.connect() as connection:
+            for record in pending:
+                entry, parameters = record
+                entry['explain'] = self.plan(connection, entry['statement'], parameters)
+                record[1] = None
+
+    def recent(self, limit=None):
+        """Entries newest first, at most `limit` of them, with their plans."""
+        with self.lock:
+            records = list(self.entries)
+        records.reverse()
+        records = records[:limit] if limit else records
+        self.explain_pending(records)
+        return [entry for entry, parameters in records]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'threshold_ms': self.threshold * 1000,
+                'capacity': self.entries.maxlen,
+                'kept': len(self.entries),
+                'recorded': self.recorded,
+            }
+
+
+def init_app(app, db):
+    """Attach a SlowQueryLog to the `db` engine when SLOW_QUERY_LOG is set.
+
+    Returns the log, or None when it is off.
+    """
+    config = app.config
+    if not config['SLOW_QUERY_LOG']:
+        return None
+    log = SlowQueryLog(config['SLOW_QUERY_MS'], size=config['SLOW_QUERY_BUFFER'], explain=config['SLOW_QUERY_EXPLAIN'])
+    with app.app_context():
+        log.attach(db.engine)
+    return log
@@ -0,0 +1,146 @@
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import quote
+from flask import Request, abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+
+
+CHUNK_SIZE = 64 * 1024
+TMP_DIR = '.incoming'
+
+# <first two hex digits>/<sha256>[.ext], relative to MEDIA_FOLDER
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+# Precompressed siblings looked for next to a file, in order of preference
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+class HashingTempFile:
+    """Temporary file in the media folder that hashes what is written to it.
+
+    The file sits next to its final location, so storing it is a hard link
+    rather than a second copy of the bytes.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+
+# Views whose file parts are stored as media
+MEDIA_UPLOAD_ENDPOINTS = frozenset({'create_book', 'update_book', 'update_profile'})
+
+# Views with their own body size limit, by config key
+CONTENT_LENGTH_LIMITS = {'bulk_import_books': 'BOOK_IMPORT_MAX_CONTENT_LENGTH'}
+
+
+class UploadRequest(Request):
+    # On the media upload views, file parts are written straight into the
+    # media folder and hashed while the body is parsed. The size limit is
+    # enforced by the parser as it reads, before anything has been buffered
+    @property
+    def max_content_length(self):
+        key = CONTENT_LENGTH_LIMITS.get(self.endpoint)
+        if key and current_app:
+            return current_app.config[key] or None
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in MEDIA_UPLOAD_ENDPOINTS:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return HashingTempFile(os.path.join(current_app.config['MEDIA_FOLDER'], TMP_DIR))
+
+
+def media_path(digest, extension):
+    return f'{digest[:2]}/{digest}{extension}'
+
+
+def media_url(relative_path):
+    return f'/media/{relative_path}'
+
+
+def file_extension(filename):
+    return os.path.splitext(secure_filename(filename or ''))[1].lower()
+
+
+def save_upload(file):
+    """Store an uploaded file under its content hash and return its URL.
+
+    Uploading the same bytes twice stores them once and returns the same
+    URL, which therefore never changes meaning and can be cached forever.
+    """
+    media_folder = current_app.config['MEDIA_FOLDER']
+    stream = file.stream
+    if not isinstance(stream, HashingTempFile):
+        # Not parsed by UploadRequest, copy it over in chunks
+        stream = HashingTempFile(os.path.join(media_folder, TMP_DIR))
+        shutil.copyfileobj(file.stream, stream, CHUNK_SIZE)
+    stream.flush()
+
+    relative_path = media_path(stream.sha256.hexdigest(), file_extension(file.filename))
+    destination = os.path.join(media_folder, relative_path)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(stream.name, destination)
+    except FileExistsError:
+        pass  # identical content is already stored
+    stream.close()
+    return media_url(relative_path)
+
+
+def send_stored_file(directory, filename, accel_prefix, max_age, immutable=False):
+    """Serve a file from `directory`, or let nginx serve it.
+
+    With ACCEL_REDIRECT on, the response only carries an X-Accel-Redirect
+    to the internal nginx location `accel_prefix`, so no worker is held up
+    by a slow client. Otherwise the file is sent from Python with Range and
+    conditional request support, preferring a precompressed .br/.gz sibling
+    the client accepts.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if current_app.config['ACCEL_REDIRECT']:
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = accel_prefix + quote(filename)
+        # nginx picks the type from the file it serves
+        del response.headers['Content-Type']
+    else:
+        encoding, suffix = next(
+            ((encoding, suffix) for encoding, suffix in PRECOMPRESSED
+             if request.accept_encodings[encoding] and os.path.isfile(path + suffix)),
+            (None, '')
+        )
+        response = send_from_directory(
+            directory, filename + suffix,
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            max_age=max_age
+        )
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    return response
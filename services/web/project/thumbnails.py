@@ -0,0 +1,81 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from . import app
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+
+# Longest side, in pixels, of each cover variant served with ?size=
+SIZES = {'small': 128, 'medium': 320, 'large': 640}
+THUMBS_DIR = 'thumbs'
+MEDIA_URL_PREFIX = '/media/'
+
+executor = ThreadPoolExecutor(
+    max_workers=app.config['THUMBNAIL_WORKERS'],
+    thread_name_prefix='thumbnails'
+)
+
+
+def available():
+    return Image is not None
+
+
+def thumbnail_format():
+    return 'WEBP' if features.check('webp') else 'JPEG'
+
+
+def thumbnail_path(relative_path, size):
+    stem = os.path.splitext(relative_path)[0]
+    extension = '.webp' if thumbnail_format() == 'WEBP' else '.jpg'
+    return os.path.join(THUMBS_DIR, size, stem + extension)
+
+
+def generate(relative_path, size):
+    """Write the `size` variant of a media file and return its relative path.
+
+    Returns None when the file is not an image Pillow can read.
+    """
+    media_folder = app.config['MEDIA_FOLDER']
+    target = thumbnail_path(relative_path, size)
+    destination = os.path.join(media_folder, target)
+    if os.path.exists(destination):
+        return target
+
+    try:
+        with Image.open(os.path.join(media_folder, relative_path)) as image:
+            image.thumbnail((SIZES[size], SIZES[size]))
+            fmt = thumbnail_format()
+            if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            # Written aside and renamed, readers never see a partial file
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination))
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    image.save(tmp, fmt, quality=app.config['THUMBNAIL_QUALITY'])
+                os.replace(tmp_path, destination)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+    except (OSError, Image.DecompressionBombError) as e:
+        app.logger.warning(f'thumbnail {relative_path} ({size}): {str(e)}')
+        return None
+    return target
+
+
+def generate_all(relative_path):
+    for size in SIZES:
+        generate(relative_path, size)
+
+
+def schedule(cover_url):
+    """Render every variant of an uploaded cover in the background pool."""
+    if not available() or not cover_url or not cover_url.startswith(MEDIA_URL_PREFIX):
+        return None
+    return executor.submit(generate_all, cover_url[len(MEDIA_URL_PREFIX):])
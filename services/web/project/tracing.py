@@ -0,0 +1,101 @@
+import threading
+import time
+import sentry_sdk
+from flask import g, request
+from werkzeug.exceptions import HTTPException
+
+
+def parse_route_rates(value):
+    """Parse "/login=0.5,/metrics=0" into {'/login': 0.5, '/metrics': 0.0}."""
+    rates = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        route, _, rate = item.rpartition('=')
+        if not route.strip():
+            raise ValueError(f'Expected route=rate, got {item!r}')
+        rates[route.strip()] = float(rate)
+    return rates
+
+
+class RouteSampler:
+    """Sentry `traces_sampler` with a rate per URL rule.
+
+    A route that just served a 5xx or a request slower than `slow_ms` is
+    traced in full for the next `boost_seconds`, so the problem is caught
+    in the traces that follow. Error events are not affected by any of
+    this; Sentry sends those regardless of trace sampling.
+    """
+
+    def __init__(self, url_map, default_rate, route_rates=None, slow_ms=1000, boost_seconds=60):
+        self.url_map = url_map
+        self.default_rate = default_rate
+        self.route_rates = route_rates or {}
+        self.slow_ms = slow_ms
+        self.boost_seconds = boost_seconds
+        self.boosted_until = {}
+        self.lock = threading.Lock()
+
+    def route_for(self, environ):
+        try:
+            rule, _ = self.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:
+            return None
+        return rule.rule
+
+    def rate_for(self, route):
+        if self.boosted_until.get(route, 0) > time.monotonic():
+            return 1.0
+        return self.route_rates.get(route, self.default_rate)
+
+    def __call__(self, sampling_context):
+        # Keep the caller's decision so distributed traces stay whole
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            return float(parent_sampled)
+        environ = sampling_context.get('wsgi_environ')
+        return self.rate_for(self.route_for(environ) if environ else None)
+
+    def observe(self, route, status, duration_ms):
+        if status >= 500 or duration_ms >= self.slow_ms:
+            with self.lock:
+                self.boosted_until[route] = time.monotonic() + self.boost_seconds
+
+
+def init_sentry(app, **options):
+    """Start Sentry when SENTRY_DSN is configured and return the sampler.
+
+    Without a DSN nothing is initialised, so neither the tracer nor the
+    profiler runs. Extra keyword arguments go to `sentry_sdk.init`.
+    """
+    config = app.config
+    if not config['SENTRY_DSN']:
+        return None
+
+    sampler = RouteSampler(
+        app.url_map,
+        default_rate=config['SENTRY_TRACES_SAMPLE_RATE'],
+        route_rates=parse_route_rates(config['SENTRY_TRACES_ROUTE_RATES']),
+        slow_ms=config['SENTRY_SLOW_REQUEST_MS'],
+        boost_seconds=config['SENTRY_BOOST_SECONDS']
+    )
+    sentry_sdk.init(
+        dsn=config['SENTRY_DSN'],
+        traces_sampler=sampler,
+        # Share of the sampled transactions that are also profiled
+        profiles_sample_rate=config['SENTRY_PROFILES_SAMPLE_RATE'],
+        **options
+    )
+
+    @app.before_request
+    def start_sampling_timer():
+        g.sampling_started = time.perf_counter()
+
+    @app.after_request
+    def observe_for_sampling(response):
+        started = g.get('sampling_started')
+        if started is not None and request.url_rule is not None:
+            sampler.observe(request.url_rule.rule, response.status_code, (time.perf_counter() - started) * 1000)
+        return response
+
+    return sampler
@@ -1,6 +1,6 @@
-import os
-from werkzeug.utils import secure_filename
-from . import app
+import base64
+import json
+from .storage import save_upload
 
 
 def handle_file_upload(file):
@@ -8,10 +8,32 @@ def handle_file_upload(file):
         return None
     
     if file:
-        filename = secure_filename(file.filename)
-        print(".... ", os.path.join(app.config["MEDIA_FOLDER"], filename))
-        directory = os.path.join(app.config["MEDIA_FOLDER"], filename)
-        file.save(directory)
-        return directory
+        # Stored under its content hash, the returned URL is stable
+        return save_upload(file)
     
     return None
+
+
+def encode_cursor(last_id):
+    # Opaque keyset cursor handed back to clients as `next_cursor`
+    payload = json.dumps({'after_id': last_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(payload['after_id'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def import_format(name):
+    # Feed format from a file name or a Content-Type
+    name = (name or '').lower()
+    if name.endswith('csv'):
+        return 'csv'
+    if name.endswith(('ndjson', 'jsonl')):
+        return 'ndjson'
+    return None
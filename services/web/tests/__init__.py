@@ -0,0 +1,13 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# The app reads its config when `project` is first imported. Point the
+# database, log file and media folder at a scratch directory so a test run
+# leaves the working tree as it found it
+scratch = tempfile.mkdtemp(prefix='book-reservation-tests-')
+atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+os.environ.setdefault('APP_FOLDER', scratch)
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(scratch, "database.db")}')
+os.environ.setdefault('LOG_FILE', os.path.join(scratch, 'app.log'))
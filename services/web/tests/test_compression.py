@@ -0,0 +1,95 @@
+import gzip
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+import brotli
+from flask import jsonify, request
+from project import app, compression, db
+from project.auth import token_cache
+from project.models import Book, User
+from tests.test_controllers import auth_headers
+
+
+class JSONProviderTestCase(unittest.TestCase):
+
+    def test_dates_and_decimals(self):
+        with app.test_request_context():
+            response = jsonify({
+                'day': date(2020, 1, 2), 'at': datetime(2020, 1, 2, 3, 4, 5),
+                'price': Decimal('9.90'), 1: 'integer key'
+            })
+        self.assertEqual(response.json, {
+            'day': '2020-01-02', 'at': '2020-01-02T03:04:05', 'price': '9.90', '1': 'integer key'
+        })
+
+    def test_request_bodies_are_parsed(self):
+        with app.test_request_context(json={'ids': [1, 2]}):
+            self.assertEqual(request.get_json(), {'ids': [1, 2]})
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        token_cache.clear()
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='reader@example.com', first_name='Test', last_name='User', password='password'))
+            for i in range(50):
+                db.session.add(Book(isbn=f'isbn-{i}', title=f'Book {i}', authors='Author', description='Words ' * 20))
+            db.session.commit()
+        self.headers = auth_headers('reader@example.com')
+
+    def tearDown(self):
+        token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def get(self, url, encoding):
+        return self.app.get(url, headers={**self.headers, 'Accept-Encoding': encoding})
+
+    def test_gzip(self):
+        plain = self.get('/list-books', 'identity')
+        response = self.get('/list-books', 'gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertLess(len(response.data), len(plain.data) / 5)
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+
+    def test_brotli_is_preferred(self):
+        plain = self.get('/list-books', 'identity')
+        response = self.get('/list-books', 'gzip, deflate, br')
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.data), plain.data)
+
+    def test_client_quality_wins(self):
+        response = self.get('/list-books', 'br;q=0.5, gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+    def test_gzip_only_without_brotli(self):
+        with mock.patch.object(compression, 'brotli', None):
+            response = self.get('/list-books', 'br, gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+    def test_small_bodies_are_sent_as_they_are(self):
+        response = self.get('/get-book/1?fields=id', 'gzip')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.json, {'id': 1})
+
+    def test_not_modified_has_no_body_to_compress(self):
+        etag = self.get('/list-books', 'gzip').headers['ETag']
+        response = self.app.get('/list-books', headers={**self.headers, 'Accept-Encoding': 'gzip',
+                                                        'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_stream_is_compressed_as_it_goes(self):
+        plain = self.get('/list-books?stream=1', 'identity')
+        response = self.get('/list-books?stream=1', 'gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(gzip.decompress(response.data), plain.data)
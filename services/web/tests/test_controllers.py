@@ -1,8 +1,22 @@
 import unittest
-from datetime import datetime
+from unittest import mock
+from datetime import datetime, date
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from project.controllers import app, db, User
+from project.controllers import app, db, User, Book
+from project.auth import token_cache
+from project.controllers import genre_cache
+from project.cache import VersionedCache
+from project.models import Genre
+from project import passwords
+from werkzeug.security import generate_password_hash
+from sqlalchemy import event
+import jwt
+
+
+def auth_headers(email):
+    token = jwt.encode({'public_id': email}, app.config['SECRET_KEY'])
+    return {'x-access-token': token.decode('UTF-8')}
 
 class TestControllers(unittest.TestCase):
 
@@ -171,6 +185,359 @@ class TestControllers(unittest.TestCase):
     #     self.assertIsInstance(response.json, list)
 
 
+class TestBookListing(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='reader@example.com', first_name='Reader', last_name='User', password='password'))
+            for i in range(5):
+                db.session.add(Book(isbn=f'isbn-{i}', title=f'Book {i}', authors='Author'))
+            db.session.commit()
+        self.headers = auth_headers('reader@example.com')
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_list_books_pages_with_cursor(self):
+        response = self.app.get('/list-books?limit=2', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['title'] for b in response.json['books']], ['Book 0', 'Book 1'])
+
+        titles = []
+        cursor = response.json['next_cursor']
+        while cursor:
+            response = self.app.get(f'/list-books?limit=2&cursor={cursor}', headers=self.headers)
+            titles.extend(b['title'] for b in response.json['books'])
+            cursor = response.json['next_cursor']
+        self.assertEqual(titles, ['Book 2', 'Book 3', 'Book 4'])
+
+    def test_list_books_after_id(self):
+        response = self.app.get('/list-books?after_id=3', headers=self.headers)
+        self.assertEqual([b['id'] for b in response.json['books']], [4, 5])
+        self.assertIsNone(response.json['next_cursor'])
+
+    def test_list_books_invalid_cursor(self):
+        response = self.app.get('/list-books?cursor=not-a-cursor', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_book_payload(self):
+        with app.app_context():
+            book = db.session.get(Book, 1)
+            book.publication_date = date(2020, 1, 2)
+            db.session.commit()
+        response = self.app.get('/get-book/1', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json), {
+            'id', 'isbn', 'title', 'authors', 'publisher', 'publication_date', 'description',
+            'language', 'num_pages', 'cover_image', 'genre_id', 'total_copies', 'available_copies'
+        })
+        self.assertEqual(response.json['publication_date'], '2020-01-02')
+        self.assertEqual(self.app.get('/get-book/99', headers=self.headers).status_code, 404)
+
+    def test_list_books_stream(self):
+        response = self.app.get('/list-books?stream=1', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 5)
+        self.assertEqual(response.json[0]['isbn'], 'isbn-0')
+
+    def test_fields_narrow_the_select_and_the_payload(self):
+        statements = []
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                response = self.app.get('/list-books?limit=2&fields=title,isbn', headers=self.headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+        self.assertEqual(response.json['books'], [{'title': 'Book 0', 'isbn': 'isbn-0'},
+                                                  {'title': 'Book 1', 'isbn': 'isbn-1'}])
+        # The cursor still works although id was not asked for
+        self.assertIsNotNone(response.json['next_cursor'])
+        book_query = next(s for s in statements if 'FROM book' in s)
+        self.assertNotIn('description', book_query)
+
+        self.assertEqual(self.app.get('/get-book/2?fields=id', headers=self.headers).json, {'id': 2})
+        response = self.app.get('/get-books?isbns=isbn-3&fields=title', headers=self.headers)
+        self.assertEqual(response.json['books'], [{'title': 'Book 3'}])
+        response = self.app.get('/list-books?stream=1&fields=num_pages', headers=self.headers)
+        self.assertEqual(response.json[0], {'num_pages': None})
+
+    def test_unknown_fields_are_rejected(self):
+        for url in ('/list-books?fields=title,password', '/get-book/1?fields=nope', '/list-books?fields=,'):
+            response = self.app.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+        self.assertIn('password', self.app.get('/list-books?fields=password', headers=self.headers).json['message'])
+
+    def test_get_books_by_id_in_requested_order(self):
+        queries = []
+        def count(*args):
+            queries.append(args)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                response = self.app.get('/get-books?ids=3,99,1,3', headers=self.headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['id'] for b in response.json['books']], [3, 1])
+        self.assertEqual(response.json['missing'], [99])
+        self.assertEqual(set(response.json['books'][0]), set(self.app.get('/get-book/3', headers=self.headers).json))
+        # User lookup, catalog version and one IN query for the books
+        self.assertLessEqual(len(queries), 3)
+
+    def test_get_books_by_isbn(self):
+        response = self.app.get('/get-books?isbns=isbn-4,unknown,isbn-0', headers=self.headers)
+        self.assertEqual([b['isbn'] for b in response.json['books']], ['isbn-4', 'isbn-0'])
+        self.assertEqual(response.json['missing'], ['unknown'])
+
+    def test_get_books_rejects_bad_batches(self):
+        for query in ('', '?ids=1&isbns=isbn-0', '?ids=a,b', '?ids=,'):
+            self.assertEqual(self.app.get(f'/get-books{query}', headers=self.headers).status_code, 400)
+        too_many = ','.join(str(i) for i in range(app.config['BOOK_BATCH_MAX'] + 1))
+        self.assertEqual(self.app.get(f'/get-books?ids={too_many}', headers=self.headers).status_code, 400)
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        token_cache.clear()
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='cached@example.com', first_name='Cached', last_name='User', password='password'))
+            db.session.commit()
+        self.headers = auth_headers('cached@example.com')
+
+    def tearDown(self):
+        token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def count_user_queries(self, path):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                response = self.app.get(path, headers=self.headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 200)
+        return len([s for s in statements if 'FROM user' in s])
+
+    def test_repeat_requests_skip_auth_query(self):
+        self.assertEqual(self.count_user_queries('/list-genres'), 1)
+        self.assertEqual(self.count_user_queries('/list-genres'), 0)
+
+    def test_user_change_invalidates_snapshot(self):
+        self.count_user_queries('/list-genres')
+        self.assertFalse(token_cache.get('cached@example.com').is_admin)
+
+        with app.app_context():
+            user = User.query.filter_by(email='cached@example.com').first()
+            user.is_admin = True
+            db.session.commit()
+
+        self.assertIsNone(token_cache.get('cached@example.com'))
+        self.assertEqual(self.count_user_queries('/list-genres'), 1)
+        self.assertTrue(token_cache.get('cached@example.com').is_admin)
+
+
+class TestConditionalGet(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='etag@example.com', first_name='Etag', last_name='User', password='password'))
+            db.session.add(Book(isbn='111', title='Cached Book', authors='Author'))
+            db.session.commit()
+        self.headers = auth_headers('etag@example.com')
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_if_none_match_returns_304_until_a_write(self):
+        response = self.app.get('/list-genres', headers=self.headers)
+        etag = response.headers['ETag']
+        self.assertIsNotNone(response.last_modified)
+
+        response = self.app.get('/list-genres', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        self.app.post('/add-genre', headers=self.headers, json={'name': 'Poetry'})
+        response = self.app.get('/list-genres', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_book_write_changes_book_validators(self):
+        etag = self.app.get('/get-book/1', headers=self.headers).headers['ETag']
+        response = self.app.get('/get-book/1', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.app.put('/update-book/1', headers=self.headers, data={
+            'isbn': '111', 'title': 'Changed Book', 'authors': 'Author'
+        })
+        response = self.app.get('/get-book/1', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['title'], 'Changed Book')
+
+    def test_if_modified_since(self):
+        response = self.app.get('/list-books', headers=self.headers)
+        last_modified = response.headers['Last-Modified']
+        response = self.app.get('/list-books', headers={**self.headers, 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+
+class TestGenreCache(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        genre_cache.invalidate()
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='genres@example.com', first_name='Genre', last_name='User', password='password', is_admin=True))
+            db.session.add(Genre(name='Fiction'))
+            db.session.commit()
+        self.headers = auth_headers('genres@example.com')
+
+    def tearDown(self):
+        genre_cache.invalidate()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_genres_are_served_from_cache(self):
+        hits = genre_cache.hits
+        self.assertEqual(self.app.get('/list-genres', headers=self.headers).json, [{'id': 1, 'name': 'Fiction'}])
+        self.assertEqual(self.app.get('/get-genre/1', headers=self.headers).json['name'], 'Fiction')
+        self.assertEqual(genre_cache.hits, hits + 1)
+        self.assertEqual(self.app.get('/get-genre/2', headers=self.headers).status_code, 404)
+
+    def test_writes_invalidate_cache(self):
+        self.app.get('/list-genres', headers=self.headers)
+        self.app.put('/update-genre/1', headers=self.headers, json={'name': 'Sci-Fi'})
+        self.assertEqual(self.app.get('/get-genre/1', headers=self.headers).json['name'], 'Sci-Fi')
+
+        self.app.delete('/delete-genre/1', headers=self.headers)
+        self.assertEqual(self.app.get('/get-genre/1', headers=self.headers).status_code, 404)
+
+    def test_version_change_from_another_worker_reloads(self):
+        self.app.get('/list-genres', headers=self.headers)
+        with app.app_context():
+            # A write made elsewhere only bumps the shared version
+            db.session.add(Genre(name='Poetry'))
+            db.session.commit()
+        genre_cache._checked_at = 0
+        self.assertEqual(self.app.get('/get-genre/2', headers=self.headers).json['name'], 'Poetry')
+
+    def test_queries_run_outside_the_cache_lock(self):
+        locked = []
+        cache = VersionedCache(
+            load=lambda: locked.append(cache._lock.locked()) or {},
+            version=lambda: locked.append(cache._lock.locked()) or 1,
+        )
+        cache.get()
+        self.assertEqual(locked, [False, False])
+
+    def test_load_racing_an_invalidate_is_not_kept(self):
+        versions = iter([1, 2])
+
+        def load():
+            # A write lands while the old rows are being read
+            cache.invalidate()
+            return {'stale': True}
+
+        cache = VersionedCache(load=load, version=lambda: next(versions))
+        self.assertEqual(cache.get(), {'stale': True})
+        cache.load = lambda: {'stale': False}
+        self.assertEqual(cache.get(), {'stale': False})
+
+    def test_cache_stats_requires_admin(self):
+        response = self.app.get('/cache-stats', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.json['genres'])
+
+
+class TestLogin(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='login@example.com', first_name='Login', last_name='User', password='password'))
+            db.session.commit()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, password='password'):
+        return self.app.post('/login', data={'email': 'login@example.com', 'password': password})
+
+    def stored_hash(self):
+        with app.app_context():
+            return User.query.filter_by(email='login@example.com').first().password_hash
+
+    def test_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('token', response.json)
+        self.assertEqual(self.login('wrong').status_code, 403)
+
+    def test_outdated_hash_is_upgraded(self):
+        with app.app_context():
+            user = User.query.filter_by(email='login@example.com').first()
+            user.password_hash = generate_password_hash('password', method='pbkdf2:sha256:1000')
+            db.session.commit()
+
+        self.assertEqual(self.login().status_code, 201)
+        self.assertFalse(passwords.needs_rehash(self.stored_hash()))
+        self.assertEqual(self.login().status_code, 201)
+
+    def test_failed_rehash_still_logs_in(self):
+        with app.app_context():
+            user = User.query.filter_by(email='login@example.com').first()
+            user.password_hash = generate_password_hash('password', method='pbkdf2:sha256:1000')
+            db.session.commit()
+        outdated = self.stored_hash()
+
+        with mock.patch.object(passwords, 'rehash_password', side_effect=passwords.VerifierBusy()):
+            response = self.login()
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('token', response.json)
+        self.assertEqual(self.stored_hash(), outdated)
+
+    def test_busy_verifier_answers_503(self):
+        permits = 0
+        while passwords.pending.acquire(blocking=False):
+            permits += 1
+        try:
+            response = self.login()
+        finally:
+            for _ in range(permits):
+                passwords.pending.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
 
 if __name__ == '__main__':
     unittest.main()
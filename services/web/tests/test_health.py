@@ -0,0 +1,81 @@
+import unittest
+from sqlalchemy import event
+from project import app, db, pool
+from project.auth import token_cache
+from project.models import User
+from tests.test_controllers import auth_headers
+
+
+class HealthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        self.statements = []
+        with app.app_context():
+            db.create_all()
+            event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+
+    def tearDown(self):
+        token_cache.clear()
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+            db.session.remove()
+            db.drop_all()
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def test_healthz_does_not_touch_the_database(self):
+        response = self.app.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'status': 'ok'})
+        self.assertEqual(self.statements, [])
+
+    def test_readyz_caches_the_database_check(self):
+        with app.app_context():
+            check = pool.ReadinessCheck(lambda: db.engine, ttl=60)
+            self.assertEqual(check(), (True, None))
+            self.assertEqual(check(), (True, None))
+        self.assertEqual(self.statements.count('SELECT 1'), 1)
+
+        response = self.app.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'status': 'ready'})
+
+    def test_readyz_failure(self):
+        def broken_engine():
+            raise RuntimeError('no route to host')
+
+        check = pool.ReadinessCheck(broken_engine, ttl=60)
+        self.assertEqual(check(), (False, 'no route to host'))
+
+    def test_pool_stats_admin_only(self):
+        with app.app_context():
+            db.session.add(User(email='admin@example.com', first_name='Admin', last_name='User',
+                                password='password', is_admin=True))
+            db.session.add(User(email='reader@example.com', first_name='Test', last_name='User',
+                                password='password'))
+            db.session.commit()
+        response = self.app.get('/pool-stats', headers=auth_headers('reader@example.com'))
+        self.assertEqual(response.status_code, 403)
+        response = self.app.get('/pool-stats', headers=auth_headers('admin@example.com'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('class', response.json)
+
+
+class EngineOptionsTestCase(unittest.TestCase):
+
+    def test_in_memory_sqlite_keeps_its_pool(self):
+        self.assertEqual(pool.engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}), {})
+
+    def test_queue_pool_settings(self):
+        options = pool.engine_options({
+            **app.config,
+            'SQLALCHEMY_DATABASE_URI': 'mysql+pymysql://user:password@db/books',
+            'DB_POOL_SIZE': 7,
+            'DB_POOL_RECYCLE': 600,
+        })
+        self.assertEqual(options['pool_size'], 7)
+        self.assertEqual(options['pool_recycle'], 600)
+        self.assertTrue(options['pool_pre_ping'])
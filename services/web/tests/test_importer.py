@@ -0,0 +1,159 @@
+import io
+import os
+import unittest
+from unittest import mock
+from project import app, db, importer, search, storage
+from project.models import Book, Genre, User
+from tests.test_controllers import auth_headers
+
+
+CSV_FEED = """isbn,title,authors,publication_date,num_pages
+111,First Book,Author One,2001-02-03,120
+222,Second Book,Author Two,,
+,Missing Isbn,Author Three,,
+333,Bad Date,Author Four,03/02/2001,
+111,First Book Revised,Author One,2001-02-03,130
+"""
+
+NDJSON_FEED = """{"isbn": "444", "title": "Json Book", "authors": "Author Five"}
+not json
+{"isbn": "555", "title": "Another Json Book", "authors": "Author Six", "num_pages": "many"}
+"""
+
+
+class ImportBooksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='importer@example.com', first_name='Import', last_name='User', password='password', is_admin=True))
+            db.session.add(Book(isbn='222', title='Old Title', authors='Author Two'))
+            db.session.commit()
+        self.headers = auth_headers('importer@example.com')
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_csv_import_upserts_and_reports_rejects(self):
+        with app.app_context():
+            report = importer.import_books(io.StringIO(CSV_FEED), 'csv', batch_size=2, commit_every=2)
+            self.assertEqual(report['inserted'], 1)
+            self.assertEqual(report['updated'], 2)
+            self.assertEqual(report['rejected'], 2)
+            self.assertEqual([e['line'] for e in report['errors']], [4, 5])
+            self.assertIn('isbn', report['errors'][0]['errors'])
+
+            books = {book.isbn: book for book in Book.query.all()}
+            self.assertEqual(books['111'].title, 'First Book Revised')
+            self.assertEqual(books['111'].num_pages, 130)
+            self.assertEqual(books['222'].title, 'Second Book')
+            self.assertEqual(search.ranked_book_ids('revised', 10), [books['111'].id])
+
+    def test_update_keeps_fields_the_feed_leaves_out(self):
+        with app.app_context():
+            genre = Genre(name='Fiction')
+            db.session.add(genre)
+            db.session.flush()
+            book = Book.query.filter_by(isbn='222').first()
+            book.genre_id, book.description, book.cover_image = genre.id, 'Kept', '/media/kept.jpg'
+            db.session.commit()
+
+            report = importer.import_books(io.StringIO('isbn,title,authors\n222,New,A\n'), 'csv')
+            self.assertEqual(report['updated'], 1)
+            book = Book.query.filter_by(isbn='222').first()
+            self.assertEqual(book.title, 'New')
+            self.assertEqual((book.genre_id, book.description, book.cover_image), (genre.id, 'Kept', '/media/kept.jpg'))
+
+            importer.import_books(io.StringIO('{"isbn": "222", "title": "New", "authors": "A", "description": null}\n'), 'ndjson')
+            self.assertIsNone(Book.query.filter_by(isbn='222').first().description)
+
+    def test_unknown_genre_is_rejected_per_row(self):
+        with app.app_context():
+            db.session.add(Genre(name='Fiction'))
+            db.session.commit()
+            feed = 'isbn,title,authors,genre_id\n111,Good,A,1\n333,Orphan,B,99\n'
+            report = importer.import_books(io.StringIO(feed), 'csv')
+            self.assertEqual(report['inserted'], 1)
+            self.assertEqual(report['errors'], [{'line': 3, 'errors': {'genre_id': 'Unknown genre'}}])
+            self.assertIsNone(Book.query.filter_by(isbn='333').first())
+
+    def test_unsupported_database_is_refused_before_reading(self):
+        feed = io.StringIO(CSV_FEED)
+        with mock.patch.object(importer, 'SUPPORTED_DIALECTS', ()):
+            with app.app_context(), self.assertRaises(importer.UnsupportedDialect):
+                importer.import_books(feed, 'csv')
+            response = self.app.post('/import-books', headers=self.headers, data={
+                'file': (io.BytesIO(CSV_FEED.encode('utf-8')), 'feed.csv')
+            })
+        self.assertEqual(feed.tell(), 0)
+        self.assertEqual(response.status_code, 501)
+
+    def test_ndjson_endpoint(self):
+        response = self.app.post(
+            '/import-books', headers={**self.headers, 'Content-Type': 'application/x-ndjson'},
+            data=NDJSON_FEED
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 1)
+        self.assertEqual(response.json['rejected'], 2)
+        self.assertEqual(response.json['errors'][1]['errors'], {'num_pages': 'Expected an integer'})
+
+    def test_csv_file_upload(self):
+        response = self.app.post('/import-books', headers=self.headers, data={
+            'file': (io.BytesIO(CSV_FEED.encode('utf-8')), 'feed.csv')
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['rejected'], 2)
+
+    def test_feed_is_not_bound_by_the_upload_limit(self):
+        limit = app.config['MAX_CONTENT_LENGTH']
+        app.config['MAX_CONTENT_LENGTH'] = 64
+        try:
+            response = self.app.post('/import-books', headers=self.headers, data={
+                'file': (io.BytesIO(CSV_FEED.encode('utf-8')), 'feed.csv')
+            })
+        finally:
+            app.config['MAX_CONTENT_LENGTH'] = limit
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['inserted'], 1)
+
+    def test_feed_over_its_own_limit_is_rejected(self):
+        limit = app.config['BOOK_IMPORT_MAX_CONTENT_LENGTH']
+        app.config['BOOK_IMPORT_MAX_CONTENT_LENGTH'] = 64
+        try:
+            streamed = self.app.post(
+                '/import-books', headers={**self.headers, 'Content-Type': 'application/x-ndjson'},
+                data=NDJSON_FEED
+            )
+            uploaded = self.app.post('/import-books', headers=self.headers, data={
+                'file': (io.BytesIO(CSV_FEED.encode('utf-8')), 'feed.csv')
+            })
+        finally:
+            app.config['BOOK_IMPORT_MAX_CONTENT_LENGTH'] = limit
+        self.assertEqual(streamed.status_code, 413)
+        self.assertEqual(uploaded.status_code, 413)
+        self.assertEqual(uploaded.json['message'], 'File too large!')
+
+    def test_feed_is_not_copied_into_the_media_folder(self):
+        incoming = os.path.join(app.config['MEDIA_FOLDER'], storage.TMP_DIR)
+        before = set(os.listdir(incoming)) if os.path.isdir(incoming) else set()
+        with mock.patch.object(storage, 'HashingTempFile') as hashing:
+            response = self.app.post('/import-books', headers=self.headers, data={
+                'file': (io.BytesIO(CSV_FEED.encode('utf-8')), 'feed.csv')
+            })
+        self.assertEqual(response.status_code, 200)
+        hashing.assert_not_called()
+        after = set(os.listdir(incoming)) if os.path.isdir(incoming) else set()
+        self.assertEqual(after, before)
+
+    def test_unknown_format(self):
+        response = self.app.post('/import-books', headers=self.headers, data='isbn')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
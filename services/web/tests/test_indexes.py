@@ -0,0 +1,80 @@
+import re
+import unittest
+from sqlalchemy import select, text
+from project import app, db
+from project.availability import copy_counts
+from project.models import Book, BookCopy, Bookmark, Profile, Reservation, Review, Transaction
+from project.reservations import RESERVED
+
+
+def used_indexes(stmt):
+    """Names of the indexes the database plans to use for `stmt`."""
+    sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'mysql':
+        return {row.key for row in db.session.execute(text(f'EXPLAIN {sql}')) if row.key}
+    plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+    return set(re.findall(r'USING (?:COVERING )?INDEX (\w+)', plan))
+
+
+class IndexUsageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def assertUses(self, stmt, index):
+        self.assertIn(index, used_indexes(stmt))
+
+    def test_claiming_a_free_copy(self):
+        # The candidate query in reservations.claim_copy
+        self.assertUses(
+            select(BookCopy.id)
+            .where(BookCopy.book_id == 1, BookCopy.availability.is_(True))
+            .order_by(BookCopy.id).limit(8),
+            'ix_bookcopy_book_id_availability'
+        )
+
+    def test_copy_counters(self):
+        total, available = copy_counts()
+        self.assertUses(select(Book.id, total, available), 'ix_bookcopy_book_id_availability')
+
+    def test_reservations_of_a_user(self):
+        self.assertUses(
+            select(Reservation.id).where(Reservation.user_id == 1, Reservation.status == RESERVED),
+            'ix_reservation_user_id_status'
+        )
+        self.assertUses(select(Reservation.id).where(Reservation.user_id == 1), 'ix_reservation_user_id_status')
+
+    def test_reservations_of_a_copy(self):
+        self.assertUses(select(Reservation.id).where(Reservation.bookcopy_id == 1), 'ix_reservation_bookcopy_id')
+
+    def test_profile_of_a_user(self):
+        # What user.profile lazy loads
+        self.assertUses(select(Profile).where(Profile.user_id == 1), 'ix_profile_user_id')
+
+    def test_books_of_a_genre(self):
+        self.assertUses(select(Book.id).where(Book.genre_id == 1), 'ix_book_genre_id')
+
+    def test_reviews_of_a_book(self):
+        self.assertUses(select(Review).where(Review.book_id == 1), 'ix_review_book_id')
+
+    def test_bookmarks(self):
+        self.assertUses(select(Bookmark.book_id).where(Bookmark.user_id == 1), 'ix_bookmark_user_id_book_id')
+        self.assertUses(select(Bookmark.user_id).where(Bookmark.book_id == 1), 'ix_bookmark_book_id')
+
+    def test_transactions_of_a_reservation(self):
+        self.assertUses(select(Transaction).where(Transaction.reservation_id == 1), 'ix_transaction_reservation_id')
+
+    def test_bookmark_is_unique(self):
+        db.session.add(Bookmark(user_id=1, book_id=1))
+        db.session.commit()
+        db.session.add(Bookmark(user_id=1, book_id=1))
+        with self.assertRaises(Exception):
+            db.session.commit()
+        db.session.rollback()
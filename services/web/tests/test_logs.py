@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from project import app, db, logs
+from project.auth import token_cache
+from project.models import User
+from tests.test_controllers import auth_headers
+
+
+def make_record(message, level=logging.INFO, **extra):
+    record = logging.LogRecord('project', level, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class QueueHandlerTestCase(unittest.TestCase):
+
+    def test_full_queue_drops_and_counts_info(self):
+        handler = logs.DroppingQueueHandler(queue.Queue(1))
+        handler.handle(make_record('first'))
+        handler.handle(make_record('second'))
+        self.assertEqual(handler.queue.get_nowait().getMessage(), 'first')
+        self.assertEqual(handler.stats()['dropped'], {'INFO': 1})
+
+    def test_full_queue_keeps_errors(self):
+        handler = logs.DroppingQueueHandler(queue.Queue(1))
+        handler.handle(make_record('access line'))
+        handler.handle(make_record('boom', level=logging.ERROR))
+        self.assertEqual(handler.queue.get_nowait().getMessage(), 'boom')
+        self.assertEqual(handler.stats()['dropped_total'], 1)
+
+
+class JsonFormatterTestCase(unittest.TestCase):
+
+    def test_request_fields(self):
+        line = logs.JsonFormatter().format(make_record('GET /list-books 200', route='/list-books',
+                                                       status=200, duration_ms=1.5, user_id=7))
+        entry = json.loads(line)
+        self.assertEqual(entry['message'], 'GET /list-books 200')
+        self.assertEqual(entry['route'], '/list-books')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['user_id'], 7)
+        self.assertNotIn('method', entry)
+
+
+class RotationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'app.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rolls_over_on_size(self):
+        handler = logs.SizedTimedRotatingFileHandler(self.path, max_bytes=100, when='midnight', backupCount=5)
+        for i in range(10):
+            handler.handle(make_record('x' * 40))
+        handler.close()
+        rotated = [name for name in os.listdir(self.directory) if name != 'app.log']
+        self.assertGreaterEqual(len(rotated), 4)
+        # Each rollover in the same period keeps its own file
+        self.assertEqual(len(set(rotated)), len(rotated))
+        self.assertLessEqual(os.path.getsize(self.path), 100)
+
+    def test_pruning_keeps_the_newest_backups(self):
+        handler = logs.SizedTimedRotatingFileHandler(self.path, max_bytes=100, when='midnight', backupCount=3)
+        for i in range(120):
+            handler.handle(make_record(f'line {i:03d}'))
+        handler.close()
+        self.assertEqual(self.kept_lines(), list(range(120 - len(self.kept_lines()), 120)))
+
+    def test_workers_sharing_the_file_rotate_it_once(self):
+        # One handler per gunicorn worker, all on the same file
+        workers = [
+            logs.SizedTimedRotatingFileHandler(self.path, max_bytes=200, when='midnight', backupCount=3)
+            for _ in range(3)
+        ]
+        for i in range(300):
+            workers[i % 3].handle(make_record(f'line {i:03d}'))
+        for handler in workers:
+            handler.close()
+
+        # The latest lines, three full backups' worth at least, no file oversized
+        kept = self.kept_lines()
+        self.assertEqual(kept, list(range(300 - len(kept), 300)))
+        self.assertGreaterEqual(len(kept), 3 * 200 // 9)
+        for name in os.listdir(self.directory):
+            self.assertLessEqual(os.path.getsize(os.path.join(self.directory, name)), 200, name)
+
+    def kept_lines(self):
+        lines = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.lock'):
+                with open(os.path.join(self.directory, name)) as f:
+                    lines.extend(int(line.split()[1]) for line in f)
+        return sorted(lines)
+
+
+class AccessLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        token_cache.clear()
+        self.app = app.test_client()
+        self.records = []
+        self.capture = logging.Handler()
+        self.capture.emit = self.records.append
+        app.logger.addHandler(self.capture)
+        with app.app_context():
+            db.create_all()
+            user = User(email='reader@example.com', first_name='Test', last_name='User', password='password')
+            db.session.add(user)
+            db.session.commit()
+            self.user_id = user.id
+
+    def tearDown(self):
+        app.logger.removeHandler(self.capture)
+        token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_request_is_logged_with_route_status_and_user(self):
+        response = self.app.get('/list-genres', headers=auth_headers('reader@example.com'))
+        self.assertEqual(response.status_code, 200)
+        record = next(r for r in self.records if getattr(r, 'status', None) is not None)
+        self.assertEqual(record.route, '/list-genres')
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.user_id, self.user_id)
+        self.assertGreaterEqual(record.duration_ms, 0)
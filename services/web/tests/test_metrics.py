@@ -0,0 +1,77 @@
+import logging
+import queue
+import unittest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from project import app, db, logs, metrics
+from project.auth import token_cache
+from project.models import User
+from tests.test_controllers import auth_headers
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='reader@example.com', first_name='Test', last_name='User', password='password'))
+            db.session.commit()
+
+    def tearDown(self):
+        token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_request_is_counted_per_route(self):
+        labels = {'method': 'GET', 'endpoint': '/list-genres'}
+        requests = sample('http_requests_total', status='200', **labels)
+        observed = sample('http_request_duration_seconds_count', **labels)
+        queries = sample('db_queries_total', endpoint='/list-genres')
+
+        response = self.app.get('/list-genres', headers=auth_headers('reader@example.com'))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(sample('http_requests_total', status='200', **labels), requests + 1)
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), observed + 1)
+        self.assertGreater(sample('db_queries_total', endpoint='/list-genres'), queries)
+        self.assertEqual(sample('http_requests_in_flight', endpoint='/list-genres'), 0)
+
+    def test_unknown_paths_share_a_label(self):
+        before = sample('http_requests_total', method='GET', endpoint=metrics.UNMATCHED, status='404')
+        self.app.get('/no-such-page')
+        self.app.get('/nor-this-one')
+        after = sample('http_requests_total', method='GET', endpoint=metrics.UNMATCHED, status='404')
+        self.assertEqual(after, before + 2)
+
+    def test_failed_statements_leave_no_timer_behind(self):
+        with app.app_context():
+            with db.engine.connect() as connection:
+                for _ in range(3):
+                    with self.assertRaises(Exception):
+                        connection.execute(text('SELECT * FROM no_such_table'))
+                connection.execute(text('SELECT 1'))
+                self.assertFalse(any(key.endswith('started') for key in connection.info))
+
+    def test_dropped_log_records_are_counted_by_level(self):
+        before = sample('log_records_dropped_total', level='INFO')
+        handler = logs.DroppingQueueHandler(queue.Queue(1), on_drop=metrics.count_log_drop)
+        for message in ('first', 'second', 'third'):
+            handler.handle(logging.LogRecord('project', logging.INFO, __file__, 1, message, None, None))
+        self.assertEqual(sample('log_records_dropped_total', level='INFO'), before + 2)
+
+    def test_metrics_endpoint(self):
+        self.app.get('/list-genres', headers=auth_headers('reader@example.com'))
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_bucket', body)
+        self.assertIn('db_pool_checkout_wait_seconds_count', body)
+        self.assertIn('log_records_dropped_total', body)
@@ -0,0 +1,89 @@
+import logging
+import unittest
+from project import app, db
+from project.auth import token_cache
+from project.controllers import genre_cache
+from project.models import Book, Genre, Profile, User
+from tests.test_controllers import auth_headers
+
+
+class QueryBudgetTestCase(unittest.TestCase):
+    """Every read endpoint over enough rows that a lazy load in a loop would
+    show up as queries over the view's @query_budget."""
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        app.config['QUERY_STATS_HEADERS'] = True
+        token_cache.clear()
+        genre_cache.invalidate()
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            user = User(email='reader@example.com', first_name='Test', last_name='User', password='password')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Profile(user_id=user.id, mobile_number='5550100', address='1 Main St'))
+            genres = [Genre(name=f'Genre {i}') for i in range(5)]
+            db.session.add_all(genres)
+            db.session.flush()
+            for i in range(30):
+                db.session.add(Book(isbn=f'isbn-{i}', title=f'Shelf Book {i}', authors='Author',
+                                    genre_id=genres[i % 5].id))
+            db.session.commit()
+            self.user_id = user.id
+        self.headers = auth_headers('reader@example.com')
+
+    def tearDown(self):
+        app.config['QUERY_STATS_HEADERS'] = False
+        token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def assertWithinQueryBudget(self, response):
+        self.assertEqual(response.status_code, 200)
+        count = int(response.headers['X-DB-Queries'])
+        budget = int(response.headers['X-DB-Query-Budget'])
+        self.assertLessEqual(count, budget, f'{response.request.path} ran {count} queries, budget {budget}')
+        return count
+
+    def test_read_endpoints_stay_within_budget(self):
+        for url in (f'/profile/{self.user_id}', '/list-books', '/list-books?fields=id,title',
+                    '/get-book/1', '/get-books?ids=1,2,3,4,5,6,7,8,9,10', '/search-books?keyword=shelf',
+                    '/list-genres', '/get-genre/1'):
+            with self.subTest(url=url):
+                token_cache.clear()
+                self.assertWithinQueryBudget(self.app.get(url, headers=self.headers))
+
+    def test_profile_is_one_query(self):
+        response = self.app.get(f'/profile/{self.user_id}')
+        self.assertEqual(self.assertWithinQueryBudget(response), 1)
+        self.assertEqual(response.json['mobile_number'], '5550100')
+        self.assertEqual(self.app.get('/profile/99').status_code, 404)
+
+    def test_genre_list_reads_its_version_once(self):
+        # Token lookup, the version @conditional and the cache share, the load
+        response = self.app.get('/list-genres', headers=self.headers)
+        self.assertEqual(self.assertWithinQueryBudget(response), 3)
+
+    def test_over_budget_is_logged_and_fails_the_check(self):
+        records = []
+        capture = logging.Handler(logging.WARNING)
+        capture.emit = records.append
+        app.logger.addHandler(capture)
+        view = app.view_functions['get_book']
+        view.query_budget, budget = 0, view.query_budget
+        try:
+            response = self.app.get('/get-book/1', headers=self.headers)
+        finally:
+            view.query_budget = budget
+            app.logger.removeHandler(capture)
+        with self.assertRaises(AssertionError):
+            self.assertWithinQueryBudget(response)
+        self.assertEqual(records[0].db_queries, int(response.headers['X-DB-Queries']))
+        self.assertIn('over its budget of 0', records[0].getMessage())
+
+    def test_headers_are_off_by_default(self):
+        app.config['QUERY_STATS_HEADERS'] = False
+        response = self.app.get('/get-book/1', headers=self.headers)
+        self.assertNotIn('X-DB-Queries', response.headers)
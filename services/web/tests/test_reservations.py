@@ -0,0 +1,174 @@
+import threading
+import unittest
+from sqlalchemy import func, select
+from project import app, db
+from project.auth import token_cache
+from project.models import Book, BookCopy, CatalogVersion, Reservation, User
+from project import availability, reservations
+from tests.test_controllers import auth_headers
+
+
+class ReservationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        token_cache.clear()
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='reserver@example.com', first_name='Reserve', last_name='User', password='password'))
+            db.session.add(User(email='other@example.com', first_name='Other', last_name='User', password='password'))
+            book = Book(isbn='111', title='Popular Book', authors='Author')
+            db.session.add(book)
+            db.session.flush()
+            db.session.add_all([BookCopy(book_id=book.id, book_type='Paperback') for _ in range(2)])
+            db.session.commit()
+        self.headers = auth_headers('reserver@example.com')
+
+    def tearDown(self):
+        token_cache.clear()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_reserve_borrow_return(self):
+        response = self.app.post('/reserve-book/1', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['status'], 'reserved')
+        reservation_id = response.json['id']
+
+        response = self.app.post(f'/borrow-book/{reservation_id}', headers=self.headers)
+        self.assertEqual(response.json['status'], 'borrowed')
+        self.assertIsNotNone(response.json['return_date'])
+
+        response = self.app.post(f'/borrow-book/{reservation_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+        response = self.app.post(f'/return-book/{reservation_id}', headers=self.headers)
+        self.assertEqual(response.json['status'], 'returned')
+        with app.app_context():
+            self.assertTrue(all(copy.availability for copy in BookCopy.query.all()))
+
+    def test_counters_follow_copies_and_reservations(self):
+        def counters():
+            response = self.app.get('/get-book/1', headers=self.headers)
+            return response.json['total_copies'], response.json['available_copies']
+
+        self.assertEqual(counters(), (2, 2))
+        reservation_id = self.app.post('/reserve-book/1', headers=self.headers).json['id']
+        self.assertEqual(counters(), (2, 1))
+        self.app.post(f'/return-book/{reservation_id}', headers=self.headers)
+        self.assertEqual(counters(), (2, 2))
+
+        with app.app_context():
+            copy = BookCopy.query.first()
+            copy.availability = False
+            db.session.add(BookCopy(book_id=1, book_type='Hardcover'))
+            db.session.commit()
+        self.assertEqual(counters(), (3, 2))
+
+        with app.app_context():
+            db.session.delete(BookCopy.query.first())
+            db.session.commit()
+        self.assertEqual(counters(), (2, 2))
+
+    def test_reservations_leave_the_catalog_version_alone(self):
+        with app.app_context():
+            db.session.add(Book(isbn='222', title='Quiet Book', authors='Author'))
+            db.session.commit()
+            version = db.session.execute(select(CatalogVersion.version).where(CatalogVersion.name == 'book')).scalar()
+        etags = {url: self.app.get(url, headers=self.headers).headers['ETag']
+                 for url in ('/get-book/1', '/get-book/2', '/list-books', '/get-books?ids=2')}
+
+        self.app.post('/reserve-book/1', headers=self.headers)
+        with app.app_context():
+            self.assertEqual(
+                db.session.execute(select(CatalogVersion.version).where(CatalogVersion.name == 'book')).scalar(),
+                version
+            )
+        for url, etag in etags.items():
+            response = self.app.get(url, headers={**self.headers, 'If-None-Match': etag})
+            # Only responses that include book 1 see its counters move
+            self.assertEqual(response.status_code, 304 if url.endswith('2') else 200, url)
+        self.assertEqual(self.app.get('/get-book/1', headers=self.headers).json['available_copies'], 1)
+
+    def test_reconcile_fixes_drift(self):
+        with app.app_context():
+            db.session.execute(Book.__table__.update().values(total_copies=7, available_copies=0))
+            db.session.commit()
+            self.assertEqual(availability.reconcile(), 1)
+            self.assertEqual(availability.reconcile(), 0)
+            book = db.session.get(Book, 1)
+            self.assertEqual((book.total_copies, book.available_copies), (2, 2))
+
+    def test_reconcile_moves_the_etag_of_drifted_books_only(self):
+        with app.app_context():
+            db.session.add(Book(isbn='222', title='Quiet Book', authors='Author'))
+            db.session.execute(Book.__table__.update().where(Book.id == 1).values(available_copies=0))
+            db.session.commit()
+        etag = self.app.get('/get-book/1', headers=self.headers).headers['ETag']
+        with app.app_context():
+            versions = dict(db.session.execute(select(Book.id, Book.copies_version)).all())
+            self.assertEqual(availability.reconcile(), 1)
+            after = dict(db.session.execute(select(Book.id, Book.copies_version)).all())
+        self.assertEqual(after, {1: versions[1] + 1, 2: versions[2]})
+
+        response = self.app.get('/get-book/1', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['available_copies'], 2)
+
+    def test_no_copy_left(self):
+        self.assertEqual(self.app.post('/reserve-book/1', headers=self.headers).status_code, 201)
+        self.assertEqual(self.app.post('/reserve-book/1', headers=self.headers).status_code, 201)
+        self.assertEqual(self.app.post('/reserve-book/1', headers=self.headers).status_code, 409)
+
+    def test_unknown_book_is_not_found(self):
+        response = self.app.post('/reserve-book/99', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['message'], 'Book not found!')
+
+    def test_only_owner_can_borrow(self):
+        reservation_id = self.app.post('/reserve-book/1', headers=self.headers).json['id']
+        response = self.app.post(f'/borrow-book/{reservation_id}', headers=auth_headers('other@example.com'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_concurrent_reservations_never_double_book(self):
+        with app.app_context():
+            book = Book(isbn='222', title='Release Day', authors='Author')
+            db.session.add(book)
+            db.session.flush()
+            db.session.add_all([BookCopy(book_id=book.id, book_type='Hardcover') for _ in range(10)])
+            db.session.commit()
+            book_id = book.id
+
+        successes = []
+        start = threading.Barrier(8)
+
+        def worker():
+            with app.app_context():
+                start.wait()
+                for _ in range(5):
+                    reservation = reservations.reserve(1, book_id)
+                    if reservation:
+                        successes.append(reservation.bookcopy_id)
+                db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(successes), 10)
+        self.assertEqual(len(set(successes)), 10)
+        with app.app_context():
+            per_copy = db.session.execute(
+                select(Reservation.bookcopy_id, func.count())
+                .group_by(Reservation.bookcopy_id)
+                .having(func.count() > 1)
+            ).all()
+            self.assertEqual(per_copy, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
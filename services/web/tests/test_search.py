@@ -0,0 +1,84 @@
+import unittest
+from project import app, db, search
+from project.models import Book, User
+from tests.test_controllers import auth_headers
+
+
+class SearchBooksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='search@example.com', first_name='Search', last_name='User', password='password'))
+            db.session.commit()
+        self.headers = auth_headers('search@example.com')
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_book(self, isbn, title, authors):
+        response = self.app.post('/add-book', headers=self.headers, data={
+            'isbn': isbn, 'title': title, 'authors': authors
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def test_search_is_ranked_and_prefix_matched(self):
+        self.add_book('111', 'A Garden Story', 'Jane Roe')
+        self.add_book('222', 'Garden Garden Garden', 'John Doe')
+        self.add_book('333', 'Winter Tales', 'Garden Smith')
+
+        response = self.app.get('/search-books?keyword=gard', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        titles = [book['title'] for book in response.json['books']]
+        self.assertEqual(len(titles), 3)
+        self.assertEqual(titles[0], 'Garden Garden Garden')
+
+        response = self.app.get('/search-books?keyword=winter smith', headers=self.headers)
+        self.assertEqual([book['isbn'] for book in response.json['books']], ['333'])
+
+    def test_search_is_paginated(self):
+        for i in range(3):
+            self.add_book(f'isbn-{i}', f'Paged Book {i}', 'Author')
+
+        response = self.app.get('/search-books?keyword=paged&limit=2', headers=self.headers)
+        self.assertEqual(len(response.json['books']), 2)
+        self.assertEqual(response.json['next_offset'], 2)
+
+        response = self.app.get('/search-books?keyword=paged&limit=2&offset=2', headers=self.headers)
+        self.assertEqual(len(response.json['books']), 1)
+        self.assertIsNone(response.json['next_offset'])
+
+    def test_index_follows_update_and_delete(self):
+        self.add_book('444', 'Old Title', 'Author')
+
+        self.app.put('/update-book/1', headers=self.headers, data={
+            'isbn': '444', 'title': 'New Title', 'authors': 'Author'
+        })
+        with app.app_context():
+            self.assertEqual(search.ranked_book_ids('old', 10), [])
+            self.assertEqual(search.ranked_book_ids('new', 10), [1])
+
+        self.app.delete('/delete-book/1', headers=self.headers)
+        with app.app_context():
+            self.assertEqual(search.ranked_book_ids('new', 10), [])
+
+    def test_search_returns_requested_fields(self):
+        self.add_book('555', 'Field Guide', 'Author')
+        self.add_book('666', 'Field Notes', 'Author')
+        response = self.app.get('/search-books?keyword=field&fields=title', headers=self.headers)
+        self.assertEqual(sorted(response.json['books'], key=lambda book: book['title']),
+                         [{'title': 'Field Guide'}, {'title': 'Field Notes'}])
+        response = self.app.get('/search-books?keyword=field&fields=title,secret', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_requires_keyword(self):
+        response = self.app.get('/search-books?keyword=%20', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from datetime import date
+from sqlalchemy import func, select
+from project import app, availability, db, seed
+from project.models import Book, BookCopy, Bookmark, Reservation, Review, Transaction, User
+from project.reservations import RETURNED
+
+SIZES = dict(users=30, genres=5, books=200, copies=500, reservations=2000, reviews=300, bookmarks=300,
+             transactions=100, today=date(2024, 6, 1))
+
+
+def table_rows(model):
+    # The password hash is salted afresh on every run
+    table = model.__table__
+    columns = [column for column in table.c if column.name != 'password_hash']
+    return db.session.execute(select(*columns).order_by(table.c.id)).all()
+
+
+class SeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_row_counts(self):
+        with app.app_context():
+            report = seed.seed(**SIZES)
+            self.assertEqual(report['book'], 200)
+            self.assertEqual(report['reservation'], 2000)
+            self.assertEqual(db.session.execute(select(func.count()).select_from(Review)).scalar(), 300)
+            self.assertEqual(db.session.execute(select(func.count()).select_from(Transaction)).scalar(), 100)
+
+    def test_copy_counters_and_open_reservations_agree(self):
+        with app.app_context():
+            seed.seed(**SIZES)
+            # Counters were written by the seeder itself
+            self.assertEqual(availability.reconcile(), 0)
+            open_per_copy = db.session.execute(
+                select(Reservation.bookcopy_id, func.count())
+                .where(Reservation.status != RETURNED)
+                .group_by(Reservation.bookcopy_id)
+            ).all()
+            self.assertTrue(open_per_copy)
+            self.assertTrue(all(count == 1 for _, count in open_per_copy))
+            unavailable = db.session.execute(
+                select(func.count()).select_from(BookCopy).where(BookCopy.availability.is_(False))
+            ).scalar()
+            self.assertEqual(unavailable, len(open_per_copy))
+
+    def test_fewer_copies_than_books(self):
+        with app.app_context():
+            report = seed.seed(**{**SIZES, 'books': 100, 'copies': 50})
+            self.assertEqual(report['bookcopy'], 50)
+            self.assertEqual(report['reservation'], 2000)
+            self.assertEqual(availability.reconcile(), 0)
+
+    def test_bookmarks_are_unique(self):
+        with app.app_context():
+            seed.seed(**SIZES)
+            pairs = db.session.execute(select(Bookmark.user_id, Bookmark.book_id)).all()
+            self.assertEqual(len(pairs), len(set(pairs)))
+
+    def test_popularity_is_skewed(self):
+        with app.app_context():
+            seed.seed(**SIZES)
+            per_book = db.session.execute(
+                select(func.count()).select_from(Reservation)
+                .join(BookCopy, BookCopy.id == Reservation.bookcopy_id)
+                .group_by(BookCopy.book_id)
+                .order_by(func.count().desc())
+            ).scalars().all()
+            # The top 10% of books take far more than 10% of the reservations
+            top = sum(per_book[:len(per_book) // 10])
+            self.assertGreater(top / sum(per_book), 0.3)
+
+    def test_same_seed_same_rows(self):
+        with app.app_context():
+            seed.seed(**SIZES)
+            first = [table_rows(model) for model in (User, Book, Reservation, Transaction)]
+            db.session.remove()
+            db.drop_all()
+            db.create_all()
+            seed.seed(**SIZES)
+            second = [table_rows(model) for model in (User, Book, Reservation, Transaction)]
+            self.assertEqual(first, second)
@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+from sqlalchemy import select, text
+from project import app, controllers, db, slowlog
+from project.auth import token_cache
+from project.models import Book, User
+from tests.test_controllers import auth_headers
+
+
+class SlowQueryLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config['SECRET_KEY'] = 'test-secret'
+        token_cache.clear()
+        self.app = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(email='admin@example.com', first_name='Admin', last_name='User',
+                            password='password', is_admin=True))
+        db.session.add(User(email='reader@example.com', first_name='Test', last_name='User', password='password'))
+        for i in range(5):
+            db.session.add(Book(isbn=f'isbn-{i}', title=f'Slow Book {i}', authors='Author'))
+        db.session.commit()
+        self.log = slowlog.SlowQueryLog(threshold_ms=0, size=50)
+        self.log.attach(db.engine)
+
+    def tearDown(self):
+        self.log.detach(db.engine)
+        token_cache.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_request_queries_are_recorded_with_context(self):
+        self.app.get('/search-books?keyword=slow', headers=auth_headers('reader@example.com'))
+        entry = next(e for e in self.log.recent() if 'FROM book' in e['statement'])
+        self.assertEqual(entry['endpoint'], '/search-books')
+        self.assertEqual(entry['method'], 'GET')
+        self.assertTrue(any('in search_books' in frame for frame in entry['stack']))
+        self.assertTrue(entry['parameters'])
+        self.assertTrue(entry['explain'])
+
+    def test_explain_shows_a_full_scan(self):
+        db.session.execute(text("SELECT id FROM book WHERE description LIKE :pattern"), {'pattern': '%x%'})
+        entry = self.log.recent(1)[0]
+        self.assertEqual(entry['endpoint'], '<none>')
+        self.assertEqual(entry['parameters'], ['%x%'])
+        self.assertTrue(any('SCAN book' in row['detail'] for row in entry['explain']))
+
+    def test_plans_are_cached_per_statement(self):
+        with mock.patch.object(slowlog, 'explain', wraps=slowlog.explain) as explain:
+            for i in range(3):
+                db.session.execute(text('SELECT id FROM book WHERE id = :id'), {'id': i})
+            self.log.recent()
+        self.assertEqual(explain.call_count, 1)
+
+    def test_explain_waits_for_the_log_to_be_read(self):
+        with mock.patch.object(slowlog, 'explain', wraps=slowlog.explain) as explain:
+            rows = db.session.execute(select(Book.id).order_by(Book.id).execution_options(yield_per=2))
+            self.assertEqual(len(rows.all()), 5)
+            self.assertEqual(explain.call_count, 0)
+            entry = self.log.recent(1)[0]
+        self.assertIn('FROM book', entry['statement'])
+        self.assertTrue(entry['explain'])
+
+    def test_buffer_keeps_the_newest_entries(self):
+        self.log.detach(db.engine)
+        self.log = slowlog.SlowQueryLog(threshold_ms=0, size=3)
+        self.log.attach(db.engine)
+        for i in range(10):
+            db.session.execute(text(f'SELECT {i}'))
+        self.assertEqual([e['statement'] for e in self.log.recent()], ['SELECT 9', 'SELECT 8', 'SELECT 7'])
+        self.assertEqual(self.log.stats()['recorded'], 10)
+
+    def test_fast_queries_are_not_recorded(self):
+        self.log.detach(db.engine)
+        self.log = slowlog.SlowQueryLog(threshold_ms=60000)
+        self.log.attach(db.engine)
+        db.session.execute(text('SELECT 1'))
+        self.assertEqual(self.log.recent(), [])
+
+    def test_endpoint_is_admin_only(self):
+        response = self.app.get('/slow-queries', headers=auth_headers('reader@example.com'))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.app.get('/slow-queries', headers=auth_headers('admin@example.com'))
+        self.assertEqual(response.json, {'enabled': False, 'queries': []})
+
+        with mock.patch.object(controllers, 'slow_query_log', self.log):
+            self.app.get('/list-books', headers=auth_headers('reader@example.com'))
+            response = self.app.get('/slow-queries?limit=2', headers=auth_headers('admin@example.com'))
+        self.assertTrue(response.json['enabled'])
+        self.assertEqual(len(response.json['queries']), 2)
+        self.assertEqual(response.json['threshold_ms'], 0)
@@ -0,0 +1,57 @@
+import unittest
+from werkzeug.test import EnvironBuilder
+from project import app, tracing
+
+
+def sampling_context(path, method='GET', **extra):
+    environ = EnvironBuilder(path=path, method=method).get_environ()
+    return {'wsgi_environ': environ, 'parent_sampled': None, **extra}
+
+
+class RouteRatesTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(tracing.parse_route_rates('/login=0.5, /metrics=0'), {'/login': 0.5, '/metrics': 0.0})
+        self.assertEqual(tracing.parse_route_rates(''), {})
+
+    def test_parse_rejects_missing_route(self):
+        with self.assertRaises(ValueError):
+            tracing.parse_route_rates('0.5')
+
+
+class RouteSamplerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sampler = tracing.RouteSampler(
+            app.url_map, default_rate=0.05,
+            route_rates={'/get-book/<int:book_id>': 0.5}, slow_ms=500, boost_seconds=60
+        )
+
+    def test_rate_follows_url_rule(self):
+        self.assertEqual(self.sampler(sampling_context('/get-book/12')), 0.5)
+        self.assertEqual(self.sampler(sampling_context('/list-genres')), 0.05)
+        self.assertEqual(self.sampler(sampling_context('/no-such-page')), 0.05)
+
+    def test_parent_decision_is_kept(self):
+        self.assertEqual(self.sampler(sampling_context('/list-genres', parent_sampled=True)), 1.0)
+        self.assertEqual(self.sampler(sampling_context('/list-genres', parent_sampled=False)), 0.0)
+
+    def test_slow_request_or_error_boosts_its_route(self):
+        self.sampler.observe('/list-genres', 200, 20)
+        self.assertEqual(self.sampler(sampling_context('/list-genres')), 0.05)
+        self.sampler.observe('/list-genres', 200, 900)
+        self.assertEqual(self.sampler(sampling_context('/list-genres')), 1.0)
+        self.sampler.observe('/get-book/<int:book_id>', 500, 5)
+        self.assertEqual(self.sampler(sampling_context('/get-book/3')), 1.0)
+        self.assertEqual(self.sampler(sampling_context('/list-books')), 0.05)
+
+
+class InitSentryTestCase(unittest.TestCase):
+
+    def test_nothing_starts_without_dsn(self):
+        original = app.config['SENTRY_DSN']
+        app.config['SENTRY_DSN'] = None
+        try:
+            self.assertIsNone(tracing.init_sentry(app))
+        finally:
+            app.config['SENTRY_DSN'] = original
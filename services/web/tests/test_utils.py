@@ -0,0 +1,176 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from project import app, db, thumbnails
+from project.models import Book, User
+from project.utils import decode_cursor, encode_cursor
+from tests.test_controllers import auth_headers
+
+
+class CursorTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(42)), 42)
+
+    def test_garbage_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('@@@')
+
+
+class MediaStorageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.media_folder = tempfile.mkdtemp()
+        self.original_media_folder = app.config['MEDIA_FOLDER']
+        app.config['MEDIA_FOLDER'] = self.media_folder
+        app.config['SECRET_KEY'] = 'test-secret'
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='media@example.com', first_name='Media', last_name='User', password='password'))
+            db.session.commit()
+        self.headers = auth_headers('media@example.com')
+
+    def tearDown(self):
+        app.config['MEDIA_FOLDER'] = self.original_media_folder
+        shutil.rmtree(self.media_folder)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def upload(self, content, filename):
+        response = self.app.post('/upload', data={'file': (io.BytesIO(content), filename)})
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True).split(': ')[1]
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_folder)
+            for root, _, names in os.walk(self.media_folder) for name in names
+        )
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.upload(b'cover bytes', 'cover.JPG')
+        second = self.upload(b'cover bytes', 'other-name.jpg')
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^/media/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_same_name_different_content_does_not_overwrite(self):
+        first = self.upload(b'first cover', 'cover.png')
+        second = self.upload(b'second cover', 'cover.png')
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.app.get(first).data, b'first cover')
+        self.assertEqual(self.app.get(second).data, b'second cover')
+
+    def test_content_addressed_media_is_immutable(self):
+        url = self.upload(b'cover bytes', 'cover.jpg')
+        response = self.app.get(url)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 31536000)
+
+    def test_range_request(self):
+        url = self.upload(b'0123456789', 'cover.jpg')
+        response = self.app.get(url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b'2345')
+
+    def test_precompressed_variant(self):
+        os.makedirs(os.path.join(self.media_folder, 'docs'))
+        with open(os.path.join(self.media_folder, 'docs', 'terms.txt'), 'wb') as f:
+            f.write(b'plain')
+        with open(os.path.join(self.media_folder, 'docs', 'terms.txt.gz'), 'wb') as f:
+            f.write(b'gzipped')
+
+        response = self.app.get('/media/docs/terms.txt', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.data, b'gzipped')
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertIn('Accept-Encoding', response.vary)
+        self.assertFalse(response.cache_control.immutable)
+
+        response = self.app.get('/media/docs/terms.txt')
+        self.assertEqual(response.data, b'plain')
+
+    def test_accel_redirect(self):
+        url = self.upload(b'cover bytes', 'cover.jpg')
+        app.config['ACCEL_REDIRECT'] = True
+        try:
+            response = self.app.get(url)
+            missing = self.app.get('/media/missing.jpg')
+        finally:
+            app.config['ACCEL_REDIRECT'] = False
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-media/' + url[len('/media/'):])
+        self.assertEqual(response.data, b'')
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_book_cover_holds_content_url(self):
+        response = self.app.post('/add-book', headers=self.headers, data={
+            'isbn': '111', 'title': 'Covered', 'authors': 'Author',
+            'cover_image': (io.BytesIO(b'book cover'), 'front.jpg')
+        })
+        self.assertEqual(response.status_code, 201)
+        with app.app_context():
+            self.assertRegex(Book.query.first().cover_image, r'^/media/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+    def test_upload_over_limit_is_rejected(self):
+        limit = app.config['MAX_CONTENT_LENGTH']
+        app.config['MAX_CONTENT_LENGTH'] = 1024
+        try:
+            response = self.app.post('/add-book', headers=self.headers, data={
+                'isbn': '111', 'title': 'Covered', 'authors': 'Author',
+                'cover_image': (io.BytesIO(b'x' * 4096), 'front.jpg')
+            })
+        finally:
+            app.config['MAX_CONTENT_LENGTH'] = limit
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual([f for f in self.stored_files() if not f.startswith('.incoming')], [])
+
+
+@unittest.skipUnless(thumbnails.available(), 'Pillow is not installed')
+class ThumbnailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.media_folder = tempfile.mkdtemp()
+        self.original_media_folder = app.config['MEDIA_FOLDER']
+        app.config['MEDIA_FOLDER'] = self.media_folder
+        self.app = app.test_client()
+
+    def tearDown(self):
+        app.config['MEDIA_FOLDER'] = self.original_media_folder
+        shutil.rmtree(self.media_folder)
+
+    def upload_cover(self):
+        image = io.BytesIO()
+        thumbnails.Image.new('RGB', (1200, 1800), 'navy').save(image, 'PNG')
+        image.seek(0)
+        response = self.app.post('/upload', data={'file': (image, 'cover.png')})
+        return response.get_data(as_text=True).split(': ')[1]
+
+    def test_background_job_renders_every_size(self):
+        url = self.upload_cover()
+        thumbnails.schedule(url).result()
+        relative_path = url[len('/media/'):]
+        for size, longest in thumbnails.SIZES.items():
+            path = os.path.join(self.media_folder, thumbnails.thumbnail_path(relative_path, size))
+            with thumbnails.Image.open(path) as image:
+                self.assertEqual(max(image.size), longest)
+
+    def test_size_is_rendered_lazily(self):
+        url = self.upload_cover()
+        response = self.app.get(f'{url}?size=small')
+        self.assertEqual(response.status_code, 200)
+        with thumbnails.Image.open(io.BytesIO(response.data)) as image:
+            self.assertEqual(image.size, (85, 128))
+        self.assertTrue(response.cache_control.immutable)
+
+    def test_unknown_size(self):
+        url = self.upload_cover()
+        self.assertEqual(self.app.get(f'{url}?size=huge').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()